@@ -0,0 +1,129 @@
+# alteracoes.py
+"""Gravação em lote das edições feitas no st.data_editor.
+
+Compara o DataFrame original com o editado de forma vetorizada e grava todas as
+linhas alteradas de uma tabela numa única chamada, com a verificação de
+conflito feita no servidor. Usado por app.py e app_sem_sorteio.py.
+"""
+import pandas as pd
+from postgrest.exceptions import APIError
+
+from conexao import funcao_inexistente
+
+
+def _iguais(a, b):
+    return (a == b) | (a.isna() & b.isna())
+
+
+def calcular_alteracoes(original, editado, chave, colunas):
+    """Linhas em que alguma das `colunas` mudou.
+
+    Devolve (valores originais, valores editados), ambos indexados pela `chave`.
+    """
+    antes = original.set_index(chave)[colunas]
+    depois = editado.set_index(chave)[colunas].reindex(antes.index)
+    alteradas = ~_iguais(antes, depois).all(axis=1)
+    return antes[alteradas], depois[alteradas]
+
+
+def _valor_json(valor):
+    """Valor de uma célula do DataFrame em tipo nativo (None para nulos)."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+def _gravar_se_iguais(client, tabela, chave_db, antes, depois):
+    """Atualiza cada linha só se o banco ainda tem os valores de `antes`; devolve os ids gravados.
+
+    Usa a RPC salvar_alteracoes (sql/alteracoes.sql), um único update com a
+    comparação no servidor. Se a função não estiver criada, faz um update
+    condicional por linha, que também compara e grava no mesmo comando.
+    """
+    alteracoes = [{
+        "id": _valor_json(id_linha),
+        "antes": {c: _valor_json(v) for c, v in antes.loc[id_linha].items()},
+        "depois": {c: _valor_json(v) for c, v in depois.loc[id_linha].items()}
+    } for id_linha in antes.index]
+    try:
+        response = client.rpc("salvar_alteracoes", {
+            "p_tabela": tabela,
+            "p_chave": chave_db,
+            "p_alteracoes": alteracoes
+        }).execute()
+        return set(response.data or [])
+    except APIError as e:
+        if not funcao_inexistente(e):
+            raise
+        gravados = set()
+        for alteracao in alteracoes:
+            query = client.table(tabela).update(alteracao["depois"]).eq(chave_db, alteracao["id"])
+            for coluna, valor in alteracao["antes"].items():
+                query = query.is_(coluna, "null") if valor is None else query.eq(coluna, valor)
+            if query.execute().data:
+                gravados.add(alteracao["id"])
+        return gravados
+
+
+def salvar_alteracoes(client, tabela, original, editado, chave, colunas, conversores=None):
+    """Grava as edições de `editado` em `tabela`, conferindo conflitos no próprio update.
+
+    `colunas` mapeia coluna exibida -> coluna do banco, incluindo a `chave`.
+    `conversores` (coluna do banco -> função) normaliza os valores exibidos
+    antes de comparar e gravar, por exemplo o telefone formatado.
+
+    Uma linha só é gravada se o banco ainda tem o valor que estava na tela, e
+    só as colunas editadas são enviadas (as demais, como `sorteado`, nunca são
+    reescritas). As linhas recusadas (outra estação alterou ou excluiu) são
+    relidas depois, só para montar o relatório de conflitos.
+
+    Devolve (gravadas, conflitos): `gravadas` tem os novos valores e os
+    anteriores (sufixo _anterior) por chave; `conflitos` tem uma linha por
+    campo em conflito.
+    """
+    conversores = conversores or {}
+    chave_db = colunas[chave]
+    editaveis = [c for c in colunas if c != chave]
+
+    antes, depois = calcular_alteracoes(original, editado, chave, editaveis)
+    if antes.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    antes = antes.rename(columns=colunas).rename_axis(chave_db)
+    depois = depois.rename(columns=colunas).rename_axis(chave_db)
+    for coluna, converter in conversores.items():
+        if coluna in antes.columns:
+            antes[coluna] = antes[coluna].map(converter)
+            depois[coluna] = depois[coluna].map(converter)
+
+    gravados = _gravar_se_iguais(client, tabela, chave_db, antes, depois)
+    sem_conflito = antes.index.map(lambda id_linha: _valor_json(id_linha) in gravados).to_numpy(dtype=bool)
+
+    conflitos = []
+    recusadas = [_valor_json(v) for v in antes.index[~sem_conflito]]
+    if recusadas:
+        atuais = pd.DataFrame(client.table(tabela).select("*").in_(chave_db, recusadas).execute().data or [])
+        if atuais.empty:
+            atuais = pd.DataFrame(columns=[chave_db, *antes.columns])
+        atuais = atuais.set_index(chave_db)
+        no_banco = atuais.reindex(antes.index)[antes.columns].copy()
+        for coluna, converter in conversores.items():
+            if coluna in no_banco.columns:
+                no_banco[coluna] = no_banco[coluna].map(converter, na_action="ignore")
+
+        for id_linha in antes.index[~sem_conflito]:
+            if id_linha not in atuais.index:
+                conflitos.append({chave_db: id_linha, "campo": "", "valor na tela": "", "valor no banco": "(excluída)", "valor editado": ""})
+                continue
+            diferentes = ~_iguais(antes.loc[id_linha], no_banco.loc[id_linha])
+            for coluna in antes.columns[diferentes.to_numpy()]:
+                conflitos.append({
+                    chave_db: id_linha,
+                    "campo": coluna,
+                    "valor na tela": antes.at[id_linha, coluna],
+                    "valor no banco": no_banco.at[id_linha, coluna],
+                    "valor editado": depois.at[id_linha, coluna]
+                })
+
+    gravadas = depois[sem_conflito].join(antes[sem_conflito].add_suffix("_anterior"))
+    return gravadas.reset_index(), pd.DataFrame(conflitos)
@@ -1,18 +1,32 @@
 import streamlit as st
-from supabase import create_client, Client
+from supabase import Client
 from postgrest.exceptions import APIError
+from storage3.utils import StorageException
 from dotenv import load_dotenv
 import os
 import pandas as pd
-import re
 import random
 import bcrypt
+import httpx
 import datetime
+import tempfile
+import threading
+import time
+import uuid
+from array import array
 from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.pdfgen import canvas
+from alteracoes import calcular_alteracoes, salvar_alteracoes
+from conexao import funcao_inexistente, metricas_conexao, obter_cliente
+from exportacao import PARQUET_DISPONIVEL, exportar_pesagens
+from fila import RESTRICAO_PESAGEM_DIARIA, FilaGravacoes, SemProtocolos, erro_de_conexao, reservar_bloco_protocolos
+from referencias import (
+    TABELAS_REFERENCIA, filtrar_por_nome, get_indice_nomes, get_reference_data,
+    invalidar_referencias, seletor_por_nome, usar_replica
+)
+from replica import Replica
+from comprovante import gerar_pdf_comprovante, gerar_pdf_lote, gerar_zip_comprovantes, imprimir_comprovante
+from sorteio import compromisso_semente, gerar_retrato, gerar_semente, hash_elegiveis, sortear_com_semente
+from telefone import DIGITOS_CELULAR, formatar_telefones, normalizar_telefone, normalizar_telefones, validar_telefones
 
 # ======================================
 # Configurações Iniciais
@@ -24,22 +38,79 @@ st.title("♻️ Sistema de Coleta Seletiva")
 # Conexão com Supabase
 # ======================================
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Impressora térmica ESC/POS da estação: "host:9100" ou dispositivo (/dev/usb/lp0)
+IMPRESSORA_TERMICA = os.getenv("IMPRESSORA_TERMICA")
+BUCKET_RETRATOS = "retratos-sorteio"  # criado por sql/sorteios.sql
+# Réplica local (SQLite) para estações com internet instável; ver replica.py
+REPLICA_LOCAL = os.getenv("REPLICA_LOCAL")
+REPLICA_INTERVALO = int(os.getenv("REPLICA_INTERVALO", "30"))  # segundos
+# Pasta da fila local de gravações (pesagens registradas sem conexão); ver fila.py
+FILA_GRAVACOES = os.getenv("FILA_GRAVACOES")
+# Cliente único do processo: as conexões HTTP sobrevivem aos reruns
+supabase: Client = obter_cliente()
+
+@st.cache_resource
+def get_replica():
+    """Réplica local do processo, sincronizada em segundo plano (None sem REPLICA_LOCAL)."""
+    if not REPLICA_LOCAL:
+        return None
+    replica = Replica(REPLICA_LOCAL)
+    replica.iniciar(supabase, REPLICA_INTERVALO)
+    return replica
+
+@st.cache_resource
+def get_fila():
+    """Fila local de gravações do processo, reenviada em segundo plano (None sem FILA_GRAVACOES)."""
+    if not FILA_GRAVACOES:
+        return None
+    fila = FilaGravacoes(FILA_GRAVACOES)
+    fila.iniciar(supabase)
+    return fila
+
+def replica_pronta():
+    """A réplica, se já tiver sido copiada por inteiro ao menos uma vez; senão None."""
+    replica = get_replica()
+    return replica if replica is not None and replica.pronta() else None
+
+# Coletores e materiais passam a vir da réplica assim que ela estiver pronta
+usar_replica(replica_pronta)
+
+def atualizar_replica(tabela=None, linhas=None, parciais=False):
+    """Leva para a réplica uma gravação desta estação e antecipa a sincronização.
+
+    As `linhas` devolvidas pelo Supabase (ou só as colunas alteradas, com
+    `parciais`) vão direto para o SQLite, para o rerun seguinte já mostrá-las;
+    o resto fica com a thread de sincronização, sem fazer a gravação esperar.
+    """
+    replica = get_replica()
+    if replica is None:
+        return
+    if linhas:
+        if parciais:
+            replica.atualizar_colunas(tabela, linhas)
+        else:
+            replica.gravar(tabela, linhas)
+    replica.agendar()
 
 # ======================================
 # Funções Auxiliares
 # ======================================
-def get_data(table_name):
-    response = supabase.table(table_name).select("*").execute()
-    if response.data:
-        return pd.DataFrame(response.data)
-    return pd.DataFrame()
+def eh_duplicidade(erro, restricao=None):
+    """Indica se o erro do PostgREST é violação de chave única (23505).
+
+    Com `restricao`, só conta a violação desse índice único (o nome aparece na
+    mensagem do Postgres).
+    """
+    mensagem = str(erro)
+    duplicidade = "23505" in mensagem or "duplicate key value violates unique constraint" in mensagem
+    return duplicidade and (restricao is None or restricao in mensagem)
 
 def insert_data(table_name, data, success_msg="✅ Registro inserido com sucesso!"):
     try:
-        supabase.table(table_name).insert(data).execute()
+        response = supabase.table(table_name).insert(data).execute()
+        if table_name in TABELAS_REFERENCIA:
+            atualizar_replica(table_name, response.data)
+            invalidar_referencias()
         st.success(success_msg)
         st.rerun()
 
@@ -47,7 +118,7 @@ def insert_data(table_name, data, success_msg="✅ Registro inserido com sucesso
         error_message = str(e)
 
         # Trata violação de chave única (duplicidade)
-        if "23505" in error_message or "duplicate key value violates unique constraint" in error_message:
+        if eh_duplicidade(e):
             if table_name == "coletores":
                 st.warning("⚠️ Já existe um coletor cadastrado com esse nome e telefone.")
             else:
@@ -56,22 +127,13 @@ def insert_data(table_name, data, success_msg="✅ Registro inserido com sucesso
             st.error(f"❌ Erro ao inserir: {error_message}")
 
 
-def formatar_celular(valor):
-    if pd.isna(valor):
-        return ""
-    apenas_numeros = re.sub(r"\D", "", str(valor))
-    if len(apenas_numeros) == 11:
-        return f"({apenas_numeros[:2]}) {apenas_numeros[2:7]}-{apenas_numeros[7:]}"
-    elif len(apenas_numeros) == 10:
-        return f"({apenas_numeros[:2]}) {apenas_numeros[2:6]}-{apenas_numeros[6:]}"
-    return valor
-
 # ======================================
 # Paginação
 # ======================================
-def paginate_dataframe(df, page_size=10, key_prefix=""):
-    total_pages = (len(df) - 1) // page_size + 1 if not df.empty else 1
-    page = st.session_state.get(f"{key_prefix}_page", 1)
+def paginacao(total_registros, page_size=10, key_prefix=""):
+    """Desenha os controles de paginação e devolve o intervalo [início, fim) da página atual."""
+    total_pages = (total_registros - 1) // page_size + 1 if total_registros else 1
+    page = min(st.session_state.get(f"{key_prefix}_page", 1), total_pages)
 
     col1, col2, col3 = st.columns([1, 3, 1])
     with col1:
@@ -85,147 +147,758 @@ def paginate_dataframe(df, page_size=10, key_prefix=""):
     start = (page - 1) * page_size
     end = start + page_size
     st.write(f"📄 Página {page}/{total_pages}")
+    return start, end
+
+def paginate_dataframe(df, page_size=10, key_prefix=""):
+    start, end = paginacao(len(df), page_size, key_prefix)
     return df.iloc[start:end]
 
 # ======================================
-# Funções do protocolo e PDF
+# Consulta paginada de pesagens
 # ======================================
-def gerar_numero_protocolo():
-    """Gera número de protocolo no formato AAMMXXXX, garantindo unicidade."""
-    hoje = datetime.date.today()
-    ano_mes = hoje.strftime("%y%m")  # Ex: 2511
-
-    # Busca o último protocolo do mês atual
-    result = supabase.table("pesagens")\
-        .select("numero_protocolo")\
-        .like("numero_protocolo", f"{ano_mes}%")\
-        .order("numero_protocolo", desc=True)\
-        .limit(1)\
+CAMPOS_PESAGEM = "id_pesagem, numero_protocolo, peso, data_pesagem, coletores(nome_completo), materiais(nome_material)"
+
+def filtrar_pesagens(query, id_coletor=None, data=None):
+    """Aplica os filtros da listagem diretamente na consulta ao PostgREST."""
+    if id_coletor is not None:
+        query = query.eq("id_coletor", id_coletor)
+    if data:
+        query = query.eq("data_pesagem", str(data))
+    return query
+
+TTL_CONTAGEM = 30  # segundos; gravações de outras estações aparecem depois disso
+
+def contar_pesagens(id_coletor=None, data=None):
+    """Total de pesagens para os filtros, guardado na sessão por TTL_CONTAGEM segundos.
+
+    Gravações desta estação descartam a contagem na hora (invalidar_contagem_pesagens).
+    """
+    replica = replica_pronta()
+    if replica is not None:
+        return replica.contar_pesagens(id_coletor, data)
+    contagens = st.session_state.setdefault("pesagens_contagem", {})
+    chave = (id_coletor, str(data) if data else None)
+    agora = time.monotonic()
+    if chave not in contagens or agora - contagens[chave][1] > TTL_CONTAGEM:
+        query = supabase.table("pesagens").select("id_pesagem", count="exact")
+        response = filtrar_pesagens(query, id_coletor, data).limit(1).execute()
+        contagens[chave] = (response.count or 0, agora)
+    return contagens[chave][0]
+
+def invalidar_contagem_pesagens():
+    st.session_state.pop("pesagens_contagem", None)
+
+def buscar_pagina_pesagens(inicio, fim, id_coletor=None, data=None):
+    """Busca só as linhas da página [inicio, fim) com os joins de coletor e material."""
+    replica = replica_pronta()
+    if replica is not None:
+        return replica.pagina_pesagens(inicio, fim, id_coletor, data)
+    query = supabase.table("pesagens").select(CAMPOS_PESAGEM)
+    response = filtrar_pesagens(query, id_coletor, data)\
+        .order("data_pesagem", desc=True)\
+        .order("id_pesagem", desc=True)\
+        .range(inicio, fim - 1)\
         .execute()
+    if not response.data:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(response.data)
+    df["Coletor"] = df["coletores"].apply(lambda x: x["nome_completo"])
+    df["Material"] = df["materiais"].apply(lambda x: x["nome_material"])
+    return df.rename(columns={
+        "id_pesagem": "ID",
+        "numero_protocolo": "Protocolo",
+        "peso": "Peso (kg)",
+        "data_pesagem": "Data"
+    })[["ID", "Protocolo", "Coletor", "Material", "Peso (kg)", "Data"]]
 
-    if result.data and result.data[0].get("numero_protocolo"):
-        ultimo = int(result.data[0]["numero_protocolo"][-4:]) + 1
-    else:
-        ultimo = 1
+# ======================================
+# Ranking
+# ======================================
+LOTE_CONSULTA = 1000  # limite padrão de linhas por resposta do PostgREST
 
-    novo_protocolo = f"{ano_mes}{str(ultimo).zfill(4)}"
+def somar_pesos(data_inicial, data_final, coluna="id_coletor"):
+    """Soma o peso por `coluna` lendo só a janela de datas, em lotes por id_pesagem."""
+    totais = pd.Series(dtype="float64")
+    ultimo_id = None
+    while True:
+        query = supabase.table("pesagens")\
+            .select(f"id_pesagem, {coluna}, peso")\
+            .gte("data_pesagem", str(data_inicial))\
+            .lte("data_pesagem", str(data_final))
+        if ultimo_id is not None:
+            query = query.gt("id_pesagem", ultimo_id)
+        lote = query.order("id_pesagem").limit(LOTE_CONSULTA).execute().data
+
+        if not lote:
+            break
+        df_lote = pd.DataFrame(lote)
+        totais = totais.add(df_lote.groupby(coluna)["peso"].sum(), fill_value=0)
+        if len(lote) < LOTE_CONSULTA:
+            break
+        ultimo_id = lote[-1]["id_pesagem"]
+    return totais
+
+def calcular_ranking(data_inicial, data_final):
+    """Ranking de coletores no intervalo, agregado no banco pela RPC ranking_coletores.
+
+    A RPC lê o resumo mensal (sql/resumo_mensal.sql) para os meses inteiros do
+    intervalo. Sem ela instalada, soma localmente apenas as pesagens do intervalo.
+    Com a réplica local, o ranking é uma consulta ao SQLite.
+    """
+    replica = replica_pronta()
+    if replica is not None:
+        return replica.totais(data_inicial, data_final).rename(columns={"coletor": "Coletor", "total_kg": "Total (kg)"})
+    try:
+        response = supabase.rpc(
+            "ranking_coletores",
+            {"data_inicial": str(data_inicial), "data_final": str(data_final)}
+        ).execute()
+        df_ranking = pd.DataFrame(response.data or [], columns=["id_coletor", "coletor", "total_kg"])
+    except APIError:
+        totais = somar_pesos(data_inicial, data_final)
+        df_coletores = get_reference_data("coletores")
+        nomes = dict(zip(df_coletores["id_coletor"], df_coletores["nome_completo"])) if not df_coletores.empty else {}
+        df_ranking = pd.DataFrame({
+            "coletor": [nomes.get(k, f"Coletor {k}") for k in totais.index],
+            "total_kg": totais.values
+        })
 
-    # Confirma se já existe (caso raro)
-    check = supabase.table("pesagens")\
-        .select("id_pesagem")\
-        .eq("numero_protocolo", novo_protocolo)\
-        .execute()
+    return (
+        df_ranking.rename(columns={"coletor": "Coletor", "total_kg": "Total (kg)"})
+        [["Coletor", "Total (kg)"]]
+        .sort_values(by="Total (kg)", ascending=False)
+        .reset_index(drop=True)
+    )
 
-    while check.data:
-        ultimo += 1
-        novo_protocolo = f"{ano_mes}{str(ultimo).zfill(4)}"
-        check = supabase.table("pesagens")\
-            .select("id_pesagem")\
-            .eq("numero_protocolo", novo_protocolo)\
-            .execute()
+def calcular_totais_por_material(data_inicial, data_final):
+    """Peso total por material no intervalo, pela RPC totais_por_material (sql/resumo_mensal.sql)."""
+    replica = replica_pronta()
+    if replica is not None:
+        return replica.totais(data_inicial, data_final, por="material")\
+            .rename(columns={"material": "Material", "total_kg": "Total (kg)"})
+    try:
+        response = supabase.rpc(
+            "totais_por_material",
+            {"data_inicial": str(data_inicial), "data_final": str(data_final)}
+        ).execute()
+        df_totais = pd.DataFrame(response.data or [], columns=["id_material", "material", "total_kg"])
+    except APIError:
+        totais = somar_pesos(data_inicial, data_final, coluna="id_material")
+        df_materiais = get_reference_data("materiais")
+        nomes = dict(zip(df_materiais["id_material"], df_materiais["nome_material"])) if not df_materiais.empty else {}
+        df_totais = pd.DataFrame({
+            "material": [nomes.get(k, f"Material {k}") for k in totais.index],
+            "total_kg": totais.values
+        })
 
-    return novo_protocolo
+    return (
+        df_totais.rename(columns={"material": "Material", "total_kg": "Total (kg)"})
+        [["Material", "Total (kg)"]]
+        .sort_values(by="Total (kg)", ascending=False)
+        .reset_index(drop=True)
+    )
 
+# ======================================
+# Painel (indicadores por mês)
+# ======================================
+TTL_MES_ATUAL = 60  # segundos até o mês corrente ser pedido de novo
+COLUNAS_DIARIO = ["dia", "id_material", "total_kg", "quantidade", "sorteados"]
+COLUNAS_MENSAL = ["mes", "coletores_ativos", "protocolos", "sorteados", "coletores_sorteados"]
+
+@st.cache_resource
+def _painel_meses():
+    """Indicadores por mês, compartilhados por todas as sessões do processo."""
+    return {"meses": {}, "lock": threading.Lock()}
+
+def invalidar_painel(datas=None):
+    """Descarta os meses das datas informadas (ou todos) do cache do painel."""
+    cache = _painel_meses()
+    with cache["lock"]:
+        if datas is None:
+            cache["meses"].clear()
+            return
+        for data in pd.to_datetime(pd.Series(list(datas))).dt.to_period("M").unique():
+            cache["meses"].pop(data.start_time.date(), None)
+
+def primeiro_dia_do_mes(data):
+    return data.replace(day=1)
+
+def meses_entre(data_inicial, data_final):
+    return [p.start_time.date() for p in pd.period_range(data_inicial, data_final, freq="M")]
+
+def buscar_indicadores(data_inicial, data_final):
+    """Peso diário por material e totais mensais do intervalo, pela RPC painel_pesagens.
+
+    Sem a RPC (sql/painel.sql), agrega localmente as pesagens lidas em lotes.
+    """
+    try:
+        dados = supabase.rpc(
+            "painel_pesagens",
+            {"data_inicial": str(data_inicial), "data_final": str(data_final)}
+        ).execute().data or {}
+        diario = pd.DataFrame(dados.get("diario") or [], columns=COLUNAS_DIARIO)
+        mensal = pd.DataFrame(dados.get("mensal") or [], columns=COLUNAS_MENSAL)
+    except APIError:
+        linhas = []
+        ultimo_id = None
+        while True:
+            query = supabase.table("pesagens")\
+                .select("id_pesagem, data_pesagem, id_coletor, id_material, peso, sorteado")\
+                .gte("data_pesagem", str(data_inicial))\
+                .lte("data_pesagem", str(data_final))
+            if ultimo_id is not None:
+                query = query.gt("id_pesagem", ultimo_id)
+            lote = query.order("id_pesagem").limit(LOTE_CONSULTA).execute().data
+            linhas.extend(lote)
+            if len(lote) < LOTE_CONSULTA:
+                break
+            ultimo_id = lote[-1]["id_pesagem"]
+        if not linhas:
+            return pd.DataFrame(columns=COLUNAS_DIARIO), pd.DataFrame(columns=COLUNAS_MENSAL)
+
+        df = pd.DataFrame(linhas).rename(columns={"data_pesagem": "dia"})
+        df["sorteado"] = df["sorteado"].fillna(False).astype(bool)
+        df["mes"] = pd.to_datetime(df["dia"]).dt.to_period("M").dt.start_time.dt.date
+        diario = df.groupby(["dia", "id_material"], as_index=False)\
+            .agg(total_kg=("peso", "sum"), quantidade=("id_pesagem", "size"), sorteados=("sorteado", "sum"))
+        mensal = df.groupby("mes").agg(
+            coletores_ativos=("id_coletor", "nunique"),
+            protocolos=("id_pesagem", "size"),
+            sorteados=("sorteado", "sum")
+        )
+        mensal["coletores_sorteados"] = df[df["sorteado"]].groupby("mes")["id_coletor"].nunique()
+        mensal = mensal.fillna(0).reset_index()[COLUNAS_MENSAL]
+
+    diario["dia"] = pd.to_datetime(diario["dia"]).dt.date
+    diario["total_kg"] = diario["total_kg"].astype(float)
+    diario["sorteados"] = diario["sorteados"].fillna(0).astype(int)
+    mensal["mes"] = pd.to_datetime(mensal["mes"]).dt.date
+    return diario, mensal
+
+def carregar_painel(data_inicial, data_final):
+    """Indicadores do intervalo, montados a partir do cache mensal.
+
+    Meses fechados são buscados uma única vez (cada sequência de meses que
+    faltam numa só chamada); o mês corrente é pedido de novo a cada
+    TTL_MES_ATUAL segundos. Um mês lido enquanto ainda era o corrente é
+    buscado mais uma vez depois da virada, para entrar no cache já fechado.
+    """
+    cache = _painel_meses()
+    mes_atual = primeiro_dia_do_mes(datetime.date.today())
+    meses = meses_entre(data_inicial, data_final)
+
+    with cache["lock"]:
+        agora = time.monotonic()
+        faltantes = [
+            mes for mes in meses
+            if mes not in cache["meses"]
+            or (not cache["meses"][mes]["fechado"]
+                and (mes < mes_atual or agora - cache["meses"][mes]["lido_em"] > TTL_MES_ATUAL))
+        ]
+
+    # Uma chamada por sequência de meses consecutivos que faltam, fora do lock:
+    # as outras sessões não esperam por esta requisição
+    sequencias = []
+    for mes in faltantes:
+        if sequencias and meses.index(mes) == meses.index(sequencias[-1][-1]) + 1:
+            sequencias[-1].append(mes)
+        else:
+            sequencias.append([mes])
+
+    lidos = {}
+    for sequencia in sequencias:
+        fim = (pd.Timestamp(sequencia[-1]) + pd.offsets.MonthEnd(0)).date()
+        diario, mensal = buscar_indicadores(sequencia[0], fim)
+        meses_diario = pd.to_datetime(diario["dia"]).dt.to_period("M").dt.start_time.dt.date
+        # Meses sem pesagens também entram no cache, para não serem pedidos de novo
+        for mes in sequencia:
+            resumo = mensal[mensal["mes"] == mes]
+            lidos[mes] = {
+                "diario": diario[meses_diario == mes],
+                "mensal": resumo if not resumo.empty else pd.DataFrame([[mes, 0, 0, 0, 0]], columns=COLUNAS_MENSAL),
+                "lido_em": agora,
+                "fechado": mes < mes_atual
+            }
+
+    with cache["lock"]:
+        cache["meses"].update(lidos)
+        blocos = [cache["meses"][mes] for mes in meses]
+
+    diario = pd.concat([b["diario"] for b in blocos], ignore_index=True)
+    diario = diario[(diario["dia"] >= data_inicial) & (diario["dia"] <= data_final)]
+    mensal = pd.concat([b["mensal"] for b in blocos], ignore_index=True)
+    return diario, mensal
 
-def gerar_pdf_comprovante(dados):
-    """Gera um PDF de comprovante compacto para impressora térmica 80mm."""
-    buffer = BytesIO()
-    
-    largura = 8*cm     # largura típica de impressora térmica
-    altura = 20*cm     # altura inicial, pode aumentar conforme linhas
-    
-    c = canvas.Canvas(buffer, pagesize=(largura, altura))
-    
-    # Cabeçalho
-    y = altura - 1*cm
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(0.2*cm, y, "♻️ SISTEMA DE COLETA SELETIVA")
-    y -= 0.6*cm
-    c.setFont("Helvetica", 9)
-    c.drawString(0.2*cm, y, "Comprovante de Pesagem")
-    
-    # Linha divisória
-    y -= 0.4*cm
-    c.setStrokeColor(colors.green)
-    c.setLineWidth(1)
-    c.line(0.2*cm, y, largura-0.2*cm, y)
-    
-    # Corpo do comprovante
-    y -= 0.6*cm
-    c.setFont("Helvetica", 9)
-    c.drawString(0.2*cm, y, f"Protocolo: {dados['protocolo']}")
-    y -= 0.5*cm
-    c.drawString(0.2*cm, y, f"Data: {dados['data']}")
-    y -= 0.5*cm
-    c.drawString(0.2*cm, y, f"Coletor: {dados['coletor']}")
-    y -= 0.5*cm
-    c.drawString(0.2*cm, y, f"Material: {dados['material']}")
-    y -= 0.5*cm
-    c.drawString(0.2*cm, y, f"Peso: {dados['peso']} kg")
-    y -= 0.6*cm
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(0.2*cm, y, f"Guarde este comprovante, seu protocolo é o seu")
-    y -= 0.5*cm
-    c.drawString(0.2*cm, y, f"número da Sorte para nossos sorteios!")
-    # Rodapé
-    y -= 1*cm
-    c.setFont("Helvetica-Oblique", 7)
-    c.setFillColor(colors.gray)
-    c.drawString(0.2*cm, y, "Emitido automaticamente pelo Sistema de Coleta Seletiva")
-    y -= 0.4*cm
-    c.drawString(0.2*cm, y, f"Desenvolvido por Leticia Freitas © {datetime.date.today().year}")
-    
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-    return buffer
-
-def sortear_protocolo(qtd=1):
-    """Sorteia protocolos ainda não sorteados, registra na tabela 'sorteios' e exibe a lista."""
-    # Busca as pesagens ainda não sorteadas
+# ======================================
+# Funções do protocolo e PDF
+# ======================================
+def reservar_protocolos(quantidade=1):
+    """Reserva `quantidade` protocolos consecutivos (AAMMXXXX) do mês numa única chamada.
+
+    A RPC reservar_protocolos (sql/protocolos.sql) incrementa o contador do mês
+    de forma atômica, então duas estações nunca recebem o mesmo número.
+    """
+    return reservar_bloco_protocolos(supabase, quantidade)
+
+def gerar_numero_protocolo():
+    """Gera número de protocolo no formato AAMMXXXX, garantindo unicidade.
+
+    Com a fila local ligada, usa primeiro os protocolos já reservados pela
+    estação, o que dispensa a rede (e funciona offline).
+    """
+    fila = get_fila()
+    if fila is not None:
+        try:
+            return fila.pool.retirar()
+        except SemProtocolos:
+            pass
+    return reservar_protocolos(1)[0]
+
+def registrar_pesagem(registro):
+    """Grava uma pesagem; devolve "gravada", "enfileirada" ou "duplicada".
+
+    Com a fila local ligada, cada pesagem leva uma chave de idempotência e, se
+    a conexão falhar (ou já estiver fora), vai para a fila em disco em vez de
+    se perder; o reenvio com a mesma chave nunca duplica a pesagem.
+    """
+    fila = get_fila()
+    chave = None
+    if fila is not None:
+        chave = str(uuid.uuid4())
+        registro = {**registro, "chave_idempotencia": chave}
+        if fila.offline:
+            fila.enfileirar("inserir_pesagem", registro, chave)
+            return "enfileirada"
+    try:
+        response = supabase.table("pesagens").insert(registro).execute()
+    except (APIError, httpx.TransportError) as e:
+        if eh_duplicidade(e, RESTRICAO_PESAGEM_DIARIA):
+            return "duplicada"
+        if fila is None or not erro_de_conexao(e):
+            raise
+        fila.enfileirar("inserir_pesagem", registro, chave)
+        return "enfileirada"
+    atualizar_replica("pesagens", response.data)
+    return "gravada"
+
+
+def buscar_dados_comprovantes(id_coletor=None, data_inicial=None, data_final=None):
+    """Dados dos comprovantes do filtro, lidos em lotes por id_pesagem."""
+    comprovantes = []
+    ultimo_id = None
+    while True:
+        query = supabase.table("pesagens").select(CAMPOS_PESAGEM)
+        if id_coletor is not None:
+            query = query.eq("id_coletor", id_coletor)
+        if data_inicial:
+            query = query.gte("data_pesagem", str(data_inicial))
+        if data_final:
+            query = query.lte("data_pesagem", str(data_final))
+        if ultimo_id is not None:
+            query = query.gt("id_pesagem", ultimo_id)
+        lote = query.order("id_pesagem").limit(LOTE_CONSULTA).execute().data
+
+        if not lote:
+            break
+        comprovantes.extend({
+            "protocolo": r["numero_protocolo"],
+            "coletor": r["coletores"]["nome_completo"],
+            "material": r["materiais"]["nome_material"],
+            "peso": r["peso"],
+            "data": r["data_pesagem"]
+        } for r in lote)
+        if len(lote) < LOTE_CONSULTA:
+            break
+        ultimo_id = lote[-1]["id_pesagem"]
+    return comprovantes
+
+def gravar_sorteio(sorteados, auditoria=None):
+    """Registra os sorteados (DataFrame na ordem do sorteio) com um insert e um update em lote."""
+    existing = supabase.table("sorteios").select("numero_sorteio").order("numero_sorteio", desc=True).limit(1).execute()
+    next_number = existing.data[0]["numero_sorteio"] + 1 if existing.data else 1
+    sorteados = sorteados.assign(numero_sorteio=range(next_number, next_number + len(sorteados)))
+
+    supabase.table("sorteios").insert([{
+        "id_pesagem": row.id_pesagem,
+        "numero_protocolo": row.numero_protocolo,
+        "numero_sorteio": row.numero_sorteio,
+        **(auditoria or {})
+    } for row in sorteados.itertuples()]).execute()
+    supabase.table("pesagens").update({"sorteado": True})\
+        .in_("id_pesagem", sorteados["id_pesagem"].tolist())\
+        .execute()
+    return sorteados
+
+def sortear_localmente(qtd):
+    """Sorteio sem as RPCs de sorteios.sql, sem carregar as linhas das pesagens elegíveis.
+
+    Lê só os ids elegíveis (em lotes, por chave), sorteia entre eles e busca as
+    linhas sorteadas, com o coletor, numa única consulta.
+    """
+    ids, _ = carregar_pesos_elegiveis()
+    if not ids:
+        return pd.DataFrame()
+
+    escolhidos = [ids[i] for i in random.sample(range(len(ids)), min(qtd, len(ids)))]
     result = supabase.table("pesagens")\
         .select("id_pesagem, numero_protocolo, coletores(nome_completo, telefone_celular)")\
+        .in_("id_pesagem", escolhidos)\
         .eq("sorteado", False)\
         .execute()
-
+    if len(result.data or []) < len(escolhidos):
+        # Outra estação sorteou parte deles entre a leitura dos ids e esta consulta
+        st.warning(
+            f"⚠️ {len(escolhidos) - len(result.data or [])} protocolo(s) escolhido(s) foram sorteados "
+            "ao mesmo tempo por outra estação e ficaram fora deste sorteio. Sorteie de novo para completar."
+        )
     if not result.data:
+        return pd.DataFrame()
+
+    ordem = {id_pesagem: i for i, id_pesagem in enumerate(escolhidos)}
+    sorteados = pd.DataFrame(sorted(result.data, key=lambda r: ordem[r["id_pesagem"]]))
+    sorteados["nome_completo"] = sorteados["coletores"].apply(lambda x: x["nome_completo"])
+    sorteados["telefone_celular"] = sorteados["coletores"].apply(lambda x: x["telefone_celular"])
+    return gravar_sorteio(sorteados.drop(columns="coletores"))
+
+def registrar_sorteados(ids, auditoria=None):
+    """Grava sorteados escolhidos no app, na ordem de `ids`.
+
+    Usa a RPC registrar_sorteio (transação única); se a função não estiver
+    criada, busca os dados dos sorteados e grava com insert e update em lote.
+    `auditoria` traz semente, hash_elegiveis, versao_algoritmo e
+    retrato_elegiveis, gravados em cada linha de sorteios.
+    """
+    auditoria = auditoria or {}
+    try:
+        response = supabase.rpc("registrar_sorteio", {
+            "p_ids": list(ids),
+            "p_semente": auditoria.get("semente"),
+            "p_hash_elegiveis": auditoria.get("hash_elegiveis"),
+            "p_versao_algoritmo": auditoria.get("versao_algoritmo"),
+            "p_retrato_elegiveis": auditoria.get("retrato_elegiveis")
+        }).execute()
+        return pd.DataFrame(response.data or [])
+    except APIError as e:
+        if not funcao_inexistente(e):
+            raise
+        result = supabase.table("pesagens")\
+            .select("id_pesagem, numero_protocolo, coletores(nome_completo, telefone_celular)")\
+            .in_("id_pesagem", list(ids))\
+            .execute()
+        sorteados = pd.DataFrame(result.data).set_index("id_pesagem").loc[list(ids)].reset_index()
+        sorteados["nome_completo"] = sorteados["coletores"].apply(lambda x: x["nome_completo"])
+        sorteados["telefone_celular"] = sorteados["coletores"].apply(lambda x: x["telefone_celular"])
+        return gravar_sorteio(sorteados.drop(columns="coletores"), auditoria)
+
+def carregar_pesos_elegiveis():
+    """Ids e pesos das pesagens não sorteadas, em ordem de id, lidos em lotes para arrays compactos."""
+    ids, pesos = array("q"), array("d")
+    ultimo_id = None
+    while True:
+        query = supabase.table("pesagens").select("id_pesagem, peso").eq("sorteado", False)
+        if ultimo_id is not None:
+            query = query.gt("id_pesagem", ultimo_id)
+        lote = query.order("id_pesagem").limit(LOTE_CONSULTA).execute().data
+
+        if not lote:
+            break
+        ids.extend(r["id_pesagem"] for r in lote)
+        pesos.extend(float(r["peso"] or 0) for r in lote)
+        if len(lote) < LOTE_CONSULTA:
+            break
+        ultimo_id = lote[-1]["id_pesagem"]
+    return ids, pesos
+
+def guardar_retrato(retrato, hash_retrato):
+    """Guarda o retrato CSV no bucket de retratos; devolve o caminho "bucket/arquivo".
+
+    O arquivo leva o nome do hash: o mesmo conjunto elegível é guardado uma vez só.
+    """
+    arquivo = f"{hash_retrato}.csv"
+    supabase.storage.from_(BUCKET_RETRATOS).upload(
+        arquivo, retrato.encode("ascii"), {"content-type": "text/csv", "upsert": "true"}
+    )
+    return f"{BUCKET_RETRATOS}/{arquivo}"
+
+def sortear_auditavel(qtd, algoritmo, semente):
+    """Sorteio reproduzível: registra semente, hash e retrato dos elegíveis e versão do algoritmo.
+
+    O retrato CSV, que permite refazer o sorteio offline com `python sorteio.py`,
+    é guardado no Storage antes do registro: nenhum sorteio fica sem ele.
+    Devolve os sorteados, o retrato e o caminho dele no Storage.
+    """
+    ids, pesos = carregar_pesos_elegiveis()
+    escolhidos = sortear_com_semente(ids, pesos, qtd, semente, algoritmo)
+    if not escolhidos:
+        return pd.DataFrame(), None, None
+
+    retrato = "".join(gerar_retrato(ids, pesos))
+    hash_retrato = hash_elegiveis(ids, pesos)
+    auditoria = {
+        "semente": semente,
+        "hash_elegiveis": hash_retrato,
+        "versao_algoritmo": algoritmo,
+        "retrato_elegiveis": guardar_retrato(retrato, hash_retrato)
+    }
+    return registrar_sorteados(escolhidos, auditoria), retrato, auditoria["retrato_elegiveis"]
+
+def sortear_protocolo(qtd=1, ponderado=False, semente=None):
+    """Sorteia protocolos ainda não sorteados, registra na tabela 'sorteios' e exibe a lista.
+
+    Sem semente, a escolha e as duas escritas acontecem numa única transação
+    pela RPC realizar_sorteio (sql/sorteios.sql). Com semente (obrigatória no
+    sorteio ponderado, em que a chance é proporcional ao peso), o sorteio é
+    auditável e pode ser refeito a partir do retrato dos elegíveis.
+    """
+    retrato = None
+    try:
+        if ponderado or semente:
+            semente = semente or gerar_semente()
+            algoritmo = "ponderado-v1" if ponderado else "uniforme-v1"
+            sorteados, retrato, caminho_retrato = sortear_auditavel(qtd, algoritmo, semente)
+        else:
+            try:
+                response = supabase.rpc("realizar_sorteio", {"p_quantidade": int(qtd)}).execute()
+                sorteados = pd.DataFrame(response.data or [])
+            except APIError as e:
+                # Sorteio local só sem a função; outro erro (trava, restrição) não sorteia nada
+                if not funcao_inexistente(e):
+                    raise
+                sorteados = sortear_localmente(qtd)
+    except APIError as e:
+        st.error(f"❌ Erro ao realizar o sorteio: {e}")
+        return
+    except StorageException as e:
+        st.error(f"❌ Não foi possível guardar o retrato dos elegíveis; o sorteio não foi feito: {e}")
+        return
+
+    if sorteados.empty:
         st.warning("🎉 Todos os protocolos já foram sorteados!")
         return
+    if len(sorteados) < qtd:
+        st.warning(f"⚠️ Existem apenas {len(sorteados)} protocolos disponíveis para sorteio.")
 
-    df = pd.DataFrame(result.data)
-    if len(df) < qtd:
-        qtd = len(df)
-        st.warning(f"⚠️ Existem apenas {qtd} protocolos disponíveis para sorteio.")
+    st.success("🎊 Sorteio realizado com sucesso!")
+    # Sorteios marcam pesagens de qualquer mês: a participação muda em todos
+    invalidar_painel()
+    atualizar_replica()
 
-    # Sorteia aleatoriamente
-    sorteados = df.sample(qtd)
-    ids_sorteados = sorteados["id_pesagem"].tolist()
+    # Exibe sorteados
+    sorteados = sorteados.sort_values("numero_sorteio")
+    sorteados_fmt = pd.DataFrame({
+        "Sorteio nº": sorteados["numero_sorteio"],
+        "Protocolo": sorteados["numero_protocolo"],
+        "Nome": sorteados["nome_completo"],
+        "Telefone": formatar_telefones(sorteados["telefone_celular"])
+    })
 
-    # Pega o próximo número de sorteio
-    existing = supabase.table("sorteios").select("numero_sorteio").order("numero_sorteio", desc=True).limit(1).execute()
-    next_number = existing.data[0]["numero_sorteio"] + 1 if existing.data else 1
+    st.dataframe(sorteados_fmt, use_container_width=True)
 
-    # Insere sorteados na tabela de sorteios e marca como sorteado
-    for i, row in enumerate(sorteados.itertuples(), start=next_number):
-        supabase.table("sorteios").insert({
-            "id_pesagem": row.id_pesagem,
-            "numero_protocolo": row.numero_protocolo,
-            "numero_sorteio": i
-        }).execute()
+    if retrato is not None:
+        st.info(
+            f"🔐 Semente revelada: `{semente}` — algoritmo `{algoritmo}`. "
+            f"O retrato dos elegíveis ficou guardado em `{caminho_retrato}` "
+            "no Storage; confira o sorteio com `python sorteio.py`."
+        )
+        st.download_button(
+            label="📥 Baixar retrato dos elegíveis (CSV)",
+            data=retrato.encode("ascii"),
+            file_name=f"elegiveis_sorteio_{sorteados['numero_sorteio'].min()}.csv",
+            mime="text/csv"
+        )
 
-        supabase.table("pesagens").update({"sorteado": True}).eq("id_pesagem", row.id_pesagem).execute()
+# ======================================
+# Histórico de sorteios (cache incremental)
+# ======================================
+@st.cache_resource
+def _historico_sorteios():
+    """Histórico compartilhado por todas as sessões do processo."""
+    return {"df": pd.DataFrame(), "ultimo": 0, "lock": threading.Lock()}
+
+def carregar_historico_sorteios():
+    """Histórico formatado, do mais recente ao mais antigo.
+
+    Sorteios não mudam depois de gravados, então cada chamada só busca os
+    números maiores que o último já guardado em cache. Nome e telefone, que
+    mudam com a edição do coletor, vêm das tabelas de referência a cada leitura.
+    """
+    cache = _historico_sorteios()
+    with cache["lock"]:
+        novos = []
+        while True:
+            lote = supabase.table("sorteios")\
+                .select("numero_sorteio, numero_protocolo, data_sorteio, pesagens(id_coletor)")\
+                .gt("numero_sorteio", cache["ultimo"])\
+                .order("numero_sorteio")\
+                .limit(LOTE_CONSULTA)\
+                .execute().data
+            if not lote:
+                break
+            novos.extend(lote)
+            cache["ultimo"] = lote[-1]["numero_sorteio"]
+            if len(lote) < LOTE_CONSULTA:
+                break
+
+        if novos:
+            df_novos = pd.DataFrame({
+                "Sorteio nº": [r["numero_sorteio"] for r in novos],
+                "Protocolo": [r["numero_protocolo"] for r in novos],
+                # Pesagem excluída depois do sorteio: sem coletor
+                "id_coletor": pd.array([(r.get("pesagens") or {}).get("id_coletor") for r in novos], dtype="Int64"),
+                "Data do Sorteio": [str(r["data_sorteio"]).split("T")[0] for r in novos]
+            })
+            cache["df"] = pd.concat([df_novos.iloc[::-1], cache["df"]], ignore_index=True)
+        historico = cache["df"]
+
+    if historico.empty:
+        return historico
+    df_coletores = get_reference_data("coletores")
+    if df_coletores.empty:
+        df_coletores = pd.DataFrame(columns=["id_coletor", "nome_completo", "telefone_celular"])
+    coletores = df_coletores.set_index("id_coletor")
+    return pd.DataFrame({
+        "Sorteio nº": historico["Sorteio nº"],
+        "Protocolo": historico["Protocolo"],
+        "Nome": historico["id_coletor"].map(coletores["nome_completo"]),
+        "Telefone": formatar_telefones(historico["id_coletor"].map(coletores["telefone_celular"])),
+        "Data do Sorteio": historico["Data do Sorteio"]
+    })
 
-    st.success("🎊 Sorteio realizado com sucesso!")
+# ======================================
+# Registro de pesagens em lote
+# ======================================
+def validar_lote_pesagens(df_lote, coletores_ids, materiais_ids):
+    """Separa o lote em linhas válidas e rejeitadas (com motivo).
+
+    Pesagens já registradas no banco não são conferidas aqui: o índice único
+    de coletor/material/dia as descarta na gravação.
+    """
+    df = df_lote.dropna(how="all").copy()
+    df["id_coletor"] = df["Coletor"].map(coletores_ids)
+    df["id_material"] = df["Material"].map(materiais_ids)
+    df["Motivo"] = None
+
+    df.loc[df["id_material"].isna(), "Motivo"] = "Material não informado"
+    df.loc[df["id_coletor"].isna(), "Motivo"] = "Coletor não informado"
+    df.loc[df["Motivo"].isna() & ~(df["Peso"] > 0), "Motivo"] = "Peso deve ser maior que zero"
+    repetidas = df.duplicated(subset=["id_coletor", "id_material"], keep="first")
+    df.loc[df["Motivo"].isna() & repetidas, "Motivo"] = "Repetida no lote"
+
+    validas = df[df["Motivo"].isna()].drop(columns="Motivo")
+    rejeitadas = df[df["Motivo"].notna()][["Coletor", "Material", "Peso", "Motivo"]]
+    return validas, rejeitadas
+
+def registrar_lote_pesagens(validas, data_pesagem):
+    """Reserva os protocolos em bloco e grava o lote com um único upsert.
+
+    Linhas que já existem no banco (mesmo coletor, material e dia) são
+    ignoradas pelo índice único; devolve (registradas, ignoradas).
+    """
+    protocolos = reservar_protocolos(len(validas))
+    registros = [{
+        "id_coletor": int(row.id_coletor),
+        "id_material": int(row.id_material),
+        "peso": float(row.Peso),
+        "data_pesagem": str(data_pesagem),
+        "numero_protocolo": protocolo
+    } for row, protocolo in zip(validas.itertuples(), protocolos)]
+
+    response = supabase.table("pesagens")\
+        .upsert(registros, on_conflict="id_coletor,id_material,data_pesagem", ignore_duplicates=True)\
+        .execute()
+    gravados = {r["numero_protocolo"] for r in response.data or []}
+    if gravados:
+        invalidar_contagem_pesagens()
+        invalidar_painel([data_pesagem])
+        atualizar_replica("pesagens", response.data)
+
+    resultado = pd.DataFrame({
+        "Protocolo": protocolos,
+        "Coletor": validas["Coletor"].tolist(),
+        "Material": validas["Material"].tolist(),
+        "Peso (kg)": validas["Peso"].tolist(),
+        "Data": str(data_pesagem)
+    })
+    registrada = resultado["Protocolo"].isin(gravados)
+    return resultado[registrada].reset_index(drop=True), resultado[~registrada].drop(columns="Protocolo")
 
-    # Exibe sorteados
-    sorteados_fmt = pd.DataFrame([{
-        "Sorteio nº": i,
-        "Protocolo": row.numero_protocolo,
-        "Nome": row.coletores["nome_completo"],
-        "Telefone": f"({row.coletores['telefone_celular'][:2]}) {row.coletores['telefone_celular'][2:7]}-{row.coletores['telefone_celular'][7:]}"
-    } for i, row in enumerate(sorteados.itertuples(), start=next_number)])
+# ======================================
+# Importação de coletores (CSV / Excel)
+# ======================================
+LOTE_IMPORTACAO = 500
+COLUNAS_IMPORTACAO = {
+    "nome": "nome_completo",
+    "nome completo": "nome_completo",
+    "nome_completo": "nome_completo",
+    "endereço": "endereco",
+    "endereco": "endereco",
+    "telefone": "telefone_celular",
+    "celular": "telefone_celular",
+    "telefone_celular": "telefone_celular"
+}
+
+def ler_planilha_coletores(arquivo, tamanho_bloco=5000):
+    """Lê a planilha em blocos (CSV é lido em streaming) já com as colunas padronizadas."""
+    if arquivo.name.lower().endswith(".xlsx"):
+        blocos = [pd.read_excel(arquivo, dtype=str)]
+    else:
+        blocos = pd.read_csv(arquivo, dtype=str, sep=None, engine="python", chunksize=tamanho_bloco)
 
-    st.dataframe(sorteados_fmt, use_container_width=True)
+    for bloco in blocos:
+        bloco.columns = bloco.columns.str.strip().str.lower()
+        bloco = bloco.rename(columns=COLUNAS_IMPORTACAO)
+        yield bloco.reindex(columns=["nome_completo", "endereco", "telefone_celular"])
+
+def importar_coletores(arquivo):
+    """Importa coletores de uma planilha, devolvendo (quantidade inserida, linhas rejeitadas).
+
+    Telefones são normalizados e validados por coluna; nome + telefone repetidos
+    na planilha ou já cadastrados são rejeitados antes de chegar ao banco.
+    """
+    df_coletores = get_reference_data("coletores")
+    vistos = set()
+    if not df_coletores.empty:
+        vistos = set(
+            df_coletores["nome_completo"].astype(str).str.strip() + "|" +
+            normalizar_telefones(df_coletores["telefone_celular"])
+        )
+
+    inseridos = 0
+    rejeitadas = []
+    linha_inicial = 2  # linha 1 é o cabeçalho
+    for bloco in ler_planilha_coletores(arquivo):
+        bloco.index = range(linha_inicial, linha_inicial + len(bloco))
+        linha_inicial += len(bloco)
+
+        bloco["nome_completo"] = bloco["nome_completo"].fillna("").str.strip()
+        bloco["endereco"] = bloco["endereco"].fillna("").str.strip()
+        bloco["telefone_celular"] = normalizar_telefones(bloco["telefone_celular"])
+        chave = bloco["nome_completo"] + "|" + bloco["telefone_celular"]
+
+        motivo = pd.Series(None, index=bloco.index, dtype="object")
+        motivo[chave.isin(vistos) | chave.duplicated()] = "Coletor já cadastrado (nome e telefone)"
+        motivo[~validar_telefones(bloco["telefone_celular"])] = "Telefone deve ter 11 dígitos (DDD + número)"
+        motivo[bloco["nome_completo"] == ""] = "Nome é obrigatório"
+
+        aceitas = bloco[motivo.isna()]
+        vistos.update(chave[motivo.isna()])
+        rejeitadas.append(bloco[motivo.notna()].assign(motivo=motivo[motivo.notna()]))
+
+        registros = aceitas.to_dict("records")
+        for i in range(0, len(registros), LOTE_IMPORTACAO):
+            response = supabase.table("coletores").upsert(
+                registros[i:i + LOTE_IMPORTACAO],
+                on_conflict="nome_completo,telefone_celular",
+                ignore_duplicates=True
+            ).execute()
+            # Linhas ignoradas pelo índice único não voltam na resposta
+            inseridos += len(response.data or [])
+            atualizar_replica("coletores", response.data)
+
+    invalidar_referencias()
+    df_rejeitadas = pd.concat(rejeitadas) if rejeitadas else pd.DataFrame()
+    return inseridos, df_rejeitadas.rename_axis("linha").reset_index()
 
 # ======================================
 # Login
@@ -271,9 +944,42 @@ if not st.session_state.logged_in:
 st.sidebar.success(f"👋 Olá, {st.session_state.username}")
 if st.sidebar.button("Sair"):
     logout()
+with st.sidebar.expander("🔌 Conexão"):
+    metricas = metricas_conexao()
+    st.caption(
+        f"{metricas['requisicoes']} requisições · {metricas['conexoes_abertas']} conexões abertas · "
+        f"{metricas['handshakes_tls']} handshakes TLS · {metricas['latencia_media_ms']:.0f} ms em média"
+    )
+    fila = get_fila()
+    if fila is not None:
+        situacao_fila = "offline" if fila.offline else "online"
+        st.caption(
+            f"📮 Fila local ({situacao_fila}): {len(fila.pendentes)} gravação(ões) pendente(s) · "
+            f"{fila.pool.disponiveis()} protocolos reservados"
+        )
+        if fila.ultimo_erro and not fila.offline:
+            st.caption(f"⚠️ Fila local parada: {fila.ultimo_erro}")
+    replica = get_replica()
+    if replica is not None:
+        sincronizado_em = replica.sincronizado_em()
+        if replica.ultimo_erro:
+            st.caption(f"🛰️ Réplica local sem sincronizar: {replica.ultimo_erro}")
+        if sincronizado_em is None:
+            st.caption("🛰️ Réplica local: primeira cópia em andamento…")
+        else:
+            st.caption(f"🛰️ Réplica local sincronizada às {sincronizado_em:%H:%M:%S}")
+if fila is not None and fila.rejeitadas:
+    with st.sidebar.expander(f"⚠️ {len(fila.rejeitadas)} gravação(ões) recusada(s) na fila"):
+        st.dataframe(
+            pd.DataFrame([{**r["dados"], "resultado": r["resultado"], "motivo": r.get("motivo")} for r in fila.rejeitadas]),
+            use_container_width=True
+        )
+        if st.button("Dispensar"):
+            fila.descartar_rejeitadas()
+            st.rerun()
 
 #menu = st.sidebar.radio("Navegação", ["Coletores", "Materiais", "Pesagens", "Ranking"])
-menu = st.sidebar.radio("Navegação", ["Coletores", "Materiais", "Pesagens", "Ranking", "Sorteio"])
+menu = st.sidebar.radio("Navegação", ["Coletores", "Materiais", "Pesagens", "Ranking", "Sorteio", "Painel"])
 
 
 # ======================================
@@ -284,19 +990,19 @@ if menu == "Coletores":
         "<p style='font-weight:bold; color:#2E8B57; font-size:20px;'>Cadastro de Coletores</p>",
         unsafe_allow_html=True
     )
-    df_coletores = get_data("coletores")
+    df_coletores = get_reference_data("coletores")
 
     with st.form("add_coletor"):
         nome = st.text_input("Nome completo do coletor")
         endereco = st.text_input("Endereço")
         telefone = st.text_input("Telefone (somente números)")
-        telefone = ''.join(filter(str.isdigit, telefone))
+        telefone = normalizar_telefone(telefone)
         submitted = st.form_submit_button("Salvar coletor")
 
         if submitted:
             if not nome:
                 st.error("❌ O nome é obrigatório.")
-            elif len(telefone) != 11:
+            elif len(telefone) != DIGITOS_CELULAR:
                 st.error("❌ O telefone deve ter 11 dígitos (DDD + número).")
             else:
                 insert_data("coletores", {
@@ -305,6 +1011,25 @@ if menu == "Coletores":
                     "telefone_celular": telefone
                 })
 
+    with st.expander("📥 Importar planilha de coletores"):
+        st.caption("Arquivo CSV ou Excel com as colunas nome, endereço e telefone.")
+        arquivo = st.file_uploader("Planilha", type=["csv", "xlsx"], key="importar_coletores")
+        if arquivo is not None and st.button("Importar coletores"):
+            try:
+                inseridos, df_rejeitadas = importar_coletores(arquivo)
+                st.success(f"✅ {inseridos} coletores importados.")
+                if not df_rejeitadas.empty:
+                    st.warning(f"⚠️ {len(df_rejeitadas)} linha(s) rejeitadas.")
+                    st.dataframe(df_rejeitadas, use_container_width=True)
+                    st.download_button(
+                        label="📥 Baixar relatório de rejeitados (CSV)",
+                        data=df_rejeitadas.to_csv(index=False).encode("utf-8"),
+                        file_name="coletores_rejeitados.csv",
+                        mime="text/csv"
+                    )
+            except (APIError, ValueError) as e:
+                st.error(f"❌ Erro ao importar planilha: {e}")
+
     if not df_coletores.empty:
         df = df_coletores.rename(columns={
             "id_coletor": "ID",
@@ -312,10 +1037,10 @@ if menu == "Coletores":
             "endereco": "Endereço",
             "telefone_celular": "Telefone"
         })
-        df["Telefone"] = df["Telefone"].apply(formatar_celular)
+        df["Telefone"] = formatar_telefones(df["Telefone"])
         filtro_nome = st.text_input("🔎 Filtrar por nome do coletor")
         if filtro_nome:
-            df = df[df["Nome"].str.contains(filtro_nome, case=False, na=False)]
+            df = filtrar_por_nome(df, "ID", "coletores", filtro_nome)
         df_paginado = paginate_dataframe(df, key_prefix="coletores")
         st.dataframe(df_paginado, use_container_width=True)
 
@@ -327,7 +1052,7 @@ elif menu == "Materiais":
         "<p style='font-weight:bold; color:#2E8B57; font-size:20px;'>Cadastro de Materiais</p>",
         unsafe_allow_html=True
     )
-    df_materiais = get_data("materiais")
+    df_materiais = get_reference_data("materiais")
 
     with st.form("add_material"):
         nome = st.text_input("Nome do material")
@@ -351,7 +1076,7 @@ elif menu == "Materiais":
         })
         filtro_nome = st.text_input("🔎 Filtrar por nome do material")
         if filtro_nome:
-            df = df[df["Nome"].str.contains(filtro_nome, case=False, na=False)]
+            df = filtrar_por_nome(df, "ID", "materiais", filtro_nome)
         df_paginado = paginate_dataframe(df, key_prefix="materiais")
         st.dataframe(df_paginado, use_container_width=True)
 
@@ -364,61 +1089,130 @@ elif menu == "Pesagens":
         unsafe_allow_html=True
     )
 
-    df_coletores = get_data("coletores")
-    df_materiais = get_data("materiais")
+    df_coletores = get_reference_data("coletores")
+    df_materiais = get_reference_data("materiais")
 
     if df_coletores.empty or df_materiais.empty:
         st.warning("Cadastre coletores e materiais antes de registrar pesagens.")
     else:
-        coletores_dict = dict(zip(df_coletores["id_coletor"], df_coletores["nome_completo"]))
-        materiais_dict = dict(zip(df_materiais["id_material"], df_materiais["nome_material"]))
+        indice_coletores = get_indice_nomes("coletores")
+        indice_materiais = get_indice_nomes("materiais")
 
         # ------------------------
         # Formulário de nova pesagem
         # ------------------------
+        # A busca fica fora do formulário para atualizar as opções a cada digitação
+        col_coletor, col_material = st.columns(2)
+        with col_coletor:
+            id_coletor = seletor_por_nome("Coletor", "coletores", key="pesagem_coletor")
+        with col_material:
+            id_material = seletor_por_nome("Material", "materiais", key="pesagem_material")
+
         with st.form("add_pesagem"):
-            coletor = st.selectbox("Coletor", list(coletores_dict.values()))
-            material = st.selectbox("Material", list(materiais_dict.values()))
             peso = st.number_input("Peso", min_value=0.0, step=0.1)
             data_pesagem = st.date_input("Data da pesagem", datetime.date.today())
             submitted = st.form_submit_button("Registrar pesagem")
 
-            if submitted:
-                id_coletor = next(k for k, v in coletores_dict.items() if v == coletor)
-                id_material = next(k for k, v in materiais_dict.items() if v == material)
-
-                # Impede mais de uma pesagem no mesmo dia por coletor e material
-                verifica = supabase.table("pesagens")\
-                    .select("id_pesagem")\
-                    .eq("id_coletor", id_coletor)\
-                    .eq("id_material", id_material)\
-                    .eq("data_pesagem", str(data_pesagem))\
-                    .execute()
+            if submitted and (id_coletor is None or id_material is None):
+                st.error("❌ Selecione o coletor e o material.")
+            elif submitted:
+                coletor = indice_coletores.nome(id_coletor)
+                material = indice_materiais.nome(id_material)
 
-                if verifica.data:
-                    st.warning(f"⚠️ O coletor {coletor} já registrou pesagem de {material} em {data_pesagem}.")
-                else:
+                # Uma pesagem por coletor/material/dia: o índice único recusa a repetição
+                try:
                     numero_protocolo = gerar_numero_protocolo()
-                    response = supabase.table("pesagens").insert({
+                    situacao = registrar_pesagem({
                         "id_coletor": id_coletor,
                         "id_material": id_material,
                         "peso": peso,
                         "data_pesagem": str(data_pesagem),
                         "numero_protocolo": numero_protocolo
-                    }).execute()
+                    })
+                except httpx.TransportError:
+                    situacao = None
+                    if get_fila() is not None:
+                        st.error("❌ Sem conexão com o banco e sem protocolos reservados nesta estação.")
+                    else:
+                        st.error("❌ Sem conexão com o banco. A pesagem não foi registrada.")
+                except APIError as e:
+                    situacao = None
+                    st.error(f"❌ Erro ao registrar pesagem: {e}")
 
-                    if response.data:
+                if situacao == "duplicada":
+                    st.warning(f"⚠️ O coletor {coletor} já registrou pesagem de {material} em {data_pesagem}.")
+                elif situacao is not None:
+                    if situacao == "gravada":
+                        invalidar_contagem_pesagens()
+                        invalidar_painel([data_pesagem])
                         st.success(f"✅ Pesagem registrada com sucesso! Protocolo: {numero_protocolo}")
-                        st.session_state["ultimo_comprovante"] = {
-                            "protocolo": numero_protocolo,
-                            "coletor": coletor,
-                            "material": material,
-                            "peso": peso,
-                            "data": str(data_pesagem)
-                        }
-                        st.rerun()
                     else:
-                        st.error("❌ Erro ao registrar pesagem.")
+                        st.session_state["comprovante_na_fila"] = numero_protocolo
+                    st.session_state["ultimo_comprovante"] = {
+                        "protocolo": numero_protocolo,
+                        "coletor": coletor,
+                        "material": material,
+                        "peso": peso,
+                        "data": str(data_pesagem)
+                    }
+                    st.rerun()
+
+        # ------------------------
+        # Registro em lote (dias de coleta)
+        # ------------------------
+        with st.expander("📦 Registro em lote"):
+            coletores_ids = dict(zip(indice_coletores.rotulos, indice_coletores.ids))
+            materiais_ids = dict(zip(indice_materiais.rotulos, indice_materiais.ids))
+            data_lote = st.date_input("Data das pesagens", datetime.date.today(), key="lote_data")
+            # Só os coletores da busca (e os já escolhidos no lote) vão para o navegador
+            busca_lote = st.text_input("🔎 Buscar coletor para o lote", key="lote_coletor_busca")
+            edicao_lote = st.session_state.get("lote_pesagens", {})
+            escolhidos = {
+                linha.get("Coletor")
+                for linha in [*edicao_lote.get("added_rows", []), *edicao_lote.get("edited_rows", {}).values()]
+            }
+            opcoes_coletor = [indice_coletores.rotulo(id_) for id_ in indice_coletores.buscar_ids(busca_lote, 50)]
+            opcoes_coletor += sorted(r for r in escolhidos if r in coletores_ids and r not in opcoes_coletor)
+            df_lote = st.data_editor(
+                pd.DataFrame({
+                    "Coletor": pd.Series(dtype="object"),
+                    "Material": pd.Series(dtype="object"),
+                    "Peso": pd.Series(dtype="float64")
+                }),
+                num_rows="dynamic",
+                use_container_width=True,
+                key="lote_pesagens",
+                column_config={
+                    "Coletor": st.column_config.SelectboxColumn("Coletor", options=opcoes_coletor),
+                    "Material": st.column_config.SelectboxColumn("Material", options=list(materiais_ids.keys())),
+                    "Peso": st.column_config.NumberColumn("Peso", min_value=0.0, step=0.1)
+                }
+            )
+
+            if st.button("Registrar lote", disabled=df_lote.dropna(how="all").empty):
+                validas, rejeitadas = validar_lote_pesagens(df_lote, coletores_ids, materiais_ids)
+                if not rejeitadas.empty:
+                    st.warning(f"⚠️ {len(rejeitadas)} linha(s) não podem ser registradas. Corrija ou remova e tente novamente.")
+                    st.dataframe(rejeitadas, use_container_width=True)
+                else:
+                    try:
+                        # O comprovante leva só o nome, não o rótulo com telefone
+                        validas = validas.assign(Coletor=validas["id_coletor"].map(indice_coletores.nome))
+                        registradas, ignoradas = registrar_lote_pesagens(validas, data_lote)
+                        st.session_state["ultimo_lote"] = registradas
+                        st.session_state["ultimo_lote_ignoradas"] = ignoradas
+                        st.session_state.pop("lote_pesagens", None)
+                        st.rerun()
+                    except APIError as e:
+                        st.error(f"❌ Erro ao registrar lote: {e}")
+
+            if "ultimo_lote" in st.session_state:
+                st.success(f"✅ {len(st.session_state['ultimo_lote'])} pesagens registradas no último lote.")
+                st.dataframe(st.session_state["ultimo_lote"], use_container_width=True)
+                ignoradas = st.session_state.get("ultimo_lote_ignoradas")
+                if ignoradas is not None and not ignoradas.empty:
+                    st.warning(f"⚠️ {len(ignoradas)} pesagem(ns) já registrada(s) nessa data foram ignoradas.")
+                    st.dataframe(ignoradas, use_container_width=True)
 
     # ======================================
     # Filtros da listagem
@@ -429,70 +1223,74 @@ elif menu == "Pesagens":
     filtro_col1, filtro_col2 = st.columns(2)
 
     with filtro_col1:
-        if not df_coletores.empty and "nome_completo" in df_coletores.columns:
-            coletores_opcoes = ["Todos"] + df_coletores["nome_completo"].tolist()
-        else:
-            coletores_opcoes = ["Todos"]
-        filtro_coletor = st.selectbox("🔎 Filtrar por coletor", coletores_opcoes)
+        filtro_coletor = seletor_por_nome("Filtrar por coletor", "coletores", key="filtro_coletor", opcional=True)
 
     with filtro_col2:
         filtro_data = st.date_input("📅 Filtrar por data (opcional)", value=None)
 
     try:
-        query = supabase.table("pesagens")\
-            .select("id_pesagem, numero_protocolo, peso, data_pesagem, coletores(nome_completo), materiais(nome_material)")\
-            .order("data_pesagem", desc=True)\
-            .execute()
+        # Filtros e paginação são resolvidos no banco: só a página atual trafega
+        total = contar_pesagens(filtro_coletor, filtro_data)
 
-        if query.data:
-            df = pd.DataFrame(query.data)
-            df["Coletor"] = df["coletores"].apply(lambda x: x["nome_completo"])
-            df["Material"] = df["materiais"].apply(lambda x: x["nome_material"])
-            df = df.rename(columns={
-                "id_pesagem": "ID",
-                "numero_protocolo": "Protocolo",
-                "peso": "Peso (kg)",
-                "data_pesagem": "Data"
-            })[["ID", "Protocolo", "Coletor", "Material", "Peso (kg)", "Data"]]
-
-            # Aplicar filtros
-            if filtro_coletor != "Todos":
-                df = df[df["Coletor"] == filtro_coletor]
-            if filtro_data:
-                df = df[df["Data"] == str(filtro_data)]
-
-            # Ordena do mais recente para o mais antigo
-            df = df.sort_values(by="Data", ascending=False).reset_index(drop=True)
-
-            # Paginação
-            df_paginado = paginate_dataframe(df, page_size=10, key_prefix="pesagens")
+        if total:
+            inicio, fim = paginacao(total, page_size=10, key_prefix="pesagens")
+            df_paginado = buscar_pagina_pesagens(inicio, fim, filtro_coletor, filtro_data)
 
             # Exibe tabela paginada com edição apenas do peso
-            df_edit = st.data_editor(df_paginado, num_rows="fixed", use_container_width=True)
-
-            # Detecta alterações e salva
+            df_edit = st.data_editor(
+                df_paginado,
+                num_rows="fixed",
+                use_container_width=True,
+                disabled=["ID", "Protocolo", "Coletor", "Material", "Data"]
+            )
+
+            # Detecta alterações e salva todas num único upsert
             if not df_paginado.equals(df_edit):
                 if st.button("💾 Salvar alterações de peso"):
-                    for i in range(len(df_edit)):
-                        old_row = df_paginado.iloc[i]
-                        new_row = df_edit.iloc[i]
-                        if old_row["Peso (kg)"] != new_row["Peso (kg)"]:
-                            supabase.table("pesagens").update({
-                                "peso": new_row["Peso (kg)"]
-                            }).eq("id_pesagem", new_row["ID"]).execute()
-                    st.success("✅ Alterações salvas com sucesso!")
-                    st.rerun()
+                    fila = get_fila()
+                    try:
+                        gravadas, conflitos = salvar_alteracoes(
+                            supabase, "pesagens", df_paginado, df_edit, "ID",
+                            {"ID": "id_pesagem", "Peso (kg)": "peso"}
+                        )
+                    except (APIError, httpx.TransportError) as e:
+                        if fila is None or not erro_de_conexao(e):
+                            raise
+                        gravadas = conflitos = None
+                        # O peso da tela vai junto: no reenvio, só grava se ninguém o alterou
+                        antes, depois = calcular_alteracoes(df_paginado, df_edit, "ID", ["Peso (kg)"])
+                        for id_pesagem, novo_peso in depois["Peso (kg)"].items():
+                            peso_anterior = antes.at[id_pesagem, "Peso (kg)"]
+                            fila.enfileirar("atualizar_peso", {
+                                "id_pesagem": int(id_pesagem),
+                                "peso": float(novo_peso),
+                                "peso_anterior": None if pd.isna(peso_anterior) else float(peso_anterior)
+                            })
+                        st.info(f"⏳ Sem conexão: {len(depois)} alteração(ões) de peso guardada(s) na fila local.")
+
+                    if gravadas is not None:
+                        if not gravadas.empty:
+                            invalidar_painel(df_paginado.set_index("ID").loc[gravadas["id_pesagem"], "Data"])
+                            atualizar_replica("pesagens", gravadas[["id_pesagem", "peso"]].to_dict("records"), parciais=True)
+                        if conflitos.empty:
+                            st.success("✅ Alterações salvas com sucesso!")
+                            st.rerun()
+                        st.warning(
+                            f"⚠️ {len(gravadas)} alteração(ões) salva(s). As linhas abaixo foram "
+                            "alteradas por outra estação e não foram gravadas:"
+                        )
+                        st.dataframe(conflitos, use_container_width=True)
 
             # ------------------------------
             # Reimpressão de comprovante
             # ------------------------------
             st.markdown("### 🧾 Reimprimir Comprovante")
-            if df.empty:
+            if df_paginado.empty:
                 st.info("Nenhum registro encontrado com os filtros aplicados.")
             else:
-                selected = st.selectbox("Selecione um protocolo:", df["Protocolo"].tolist())
+                selected = st.selectbox("Selecione um protocolo:", df_paginado["Protocolo"].tolist())
                 if st.button("📄 Gerar comprovante selecionado"):
-                    registro = df[df["Protocolo"] == selected].iloc[0]
+                    registro = df_paginado[df_paginado["Protocolo"] == selected].iloc[0]
                     st.session_state["ultimo_comprovante"] = {
                         "protocolo": registro["Protocolo"],
                         "coletor": registro["Coletor"],
@@ -502,11 +1300,84 @@ elif menu == "Pesagens":
                     }
                     st.success(f"Comprovante do protocolo {selected} gerado!")
                     st.rerun()
+
+                # A seleção acima cobre só a página; aqui, todas as pesagens do filtro
+                if st.button(f"🧾 Reimprimir todos os {total} comprovantes do filtro"):
+                    comprovantes = buscar_dados_comprovantes(filtro_coletor, filtro_data, filtro_data)
+                    st.download_button(
+                        label=f"📥 Baixar {len(comprovantes)} comprovantes (PDF)",
+                        data=gerar_pdf_lote(comprovantes, BytesIO()).getvalue(),
+                        file_name="comprovantes_filtro.pdf",
+                        mime="application/pdf"
+                    )
+        elif filtro_coletor is not None or filtro_data:
+            st.info("Nenhum registro encontrado com os filtros aplicados.")
         else:
             st.info("Ainda não há pesagens registradas.")
     except Exception as e:
         st.error(f"❌ Erro ao carregar pesagens: {e}")
 
+    # ------------------------------
+    # Comprovantes em lote (reimpressão do mês)
+    # ------------------------------
+    with st.expander("🧾 Comprovantes em lote"):
+        lote_col1, lote_col2, lote_col3 = st.columns(3)
+        with lote_col1:
+            lote_coletor = seletor_por_nome("Coletor", "coletores", key="comprovantes_coletor", opcional=True)
+        with lote_col2:
+            lote_inicio = st.date_input("Data inicial", value=None, key="comprovantes_inicio")
+        with lote_col3:
+            lote_fim = st.date_input("Data final", value=None, key="comprovantes_fim")
+        formato = st.radio("Formato", ["PDF único", "ZIP (um PDF por protocolo)"], horizontal=True)
+
+        if st.button("Gerar comprovantes"):
+            comprovantes = buscar_dados_comprovantes(lote_coletor, lote_inicio, lote_fim)
+            if not comprovantes:
+                st.info("Nenhum registro encontrado com os filtros aplicados.")
+            elif formato == "PDF único":
+                st.download_button(
+                    label=f"📥 Baixar {len(comprovantes)} comprovantes (PDF)",
+                    data=gerar_pdf_lote(comprovantes, BytesIO()).getvalue(),
+                    file_name="comprovantes.pdf",
+                    mime="application/pdf"
+                )
+            else:
+                st.download_button(
+                    label=f"📥 Baixar {len(comprovantes)} comprovantes (ZIP)",
+                    data=gerar_zip_comprovantes(comprovantes, BytesIO()).getvalue(),
+                    file_name="comprovantes.zip",
+                    mime="application/zip"
+                )
+
+    # ------------------------------
+    # Exportação para contabilidade / prefeitura
+    # ------------------------------
+    with st.expander("📤 Exportar pesagens"):
+        exp_col1, exp_col2 = st.columns(2)
+        with exp_col1:
+            exp_inicio = st.date_input("Data inicial", primeiro_dia_do_mes(datetime.date.today()), key="exportar_inicio")
+        with exp_col2:
+            exp_fim = st.date_input("Data final", datetime.date.today(), key="exportar_fim")
+        formatos = ["CSV", "Parquet"] if PARQUET_DISPONIVEL else ["CSV"]
+        exp_formato = st.radio("Formato", formatos, horizontal=True, key="exportar_formato")
+
+        if st.button("Gerar arquivo"):
+            if exp_inicio > exp_fim:
+                st.error("❌ A data inicial não pode ser maior que a data final.")
+            else:
+                # Os lotes vão direto para um arquivo temporário em disco, não para a memória
+                extensao = exp_formato.lower()
+                arquivo = tempfile.TemporaryFile()
+                with st.spinner("Exportando pesagens..."):
+                    linhas = exportar_pesagens(supabase, exp_inicio, exp_fim, arquivo, extensao)
+                arquivo.seek(0)
+                st.download_button(
+                    label=f"📥 Baixar {linhas} pesagens ({exp_formato})",
+                    data=arquivo,
+                    file_name=f"pesagens_{exp_inicio}_{exp_fim}.{extensao}",
+                    mime="text/csv" if extensao == "csv" else "application/octet-stream"
+                )
+
 # ======================================
 # Exibir comprovante (novo ou reimpresso)
 # ======================================
@@ -514,6 +1385,8 @@ if "ultimo_comprovante" in st.session_state:
     comp = st.session_state["ultimo_comprovante"]
     st.markdown("---")
     st.markdown("### 🧾 Comprovante de Pesagem")
+    if comp["protocolo"] == st.session_state.get("comprovante_na_fila"):
+        st.info("⏳ Sem conexão: pesagem guardada na fila local. Será enviada quando a conexão voltar.")
     st.write(f"**Protocolo:** {comp['protocolo']}")
     st.write(f"**Coletor:** {comp['coletor']}")
     st.write(f"**Material:** {comp['material']}")
@@ -531,11 +1404,18 @@ if "ultimo_comprovante" in st.session_state:
         mime="application/pdf",
         key=f"download_{comp['protocolo']}"
     )
+    if IMPRESSORA_TERMICA:
+        if st.button("🖨️ Imprimir na térmica", key=f"imprimir_{comp['protocolo']}"):
+            try:
+                imprimir_comprovante(comp, IMPRESSORA_TERMICA)
+                st.success("✅ Comprovante enviado para a impressora.")
+            except OSError as e:
+                st.error(f"❌ Erro ao imprimir: {e}")
 
 # ======================================
 # Ranking
 # ======================================
-elif menu == "Ranking":
+if menu == "Ranking":
     st.markdown(
         "<p style='font-weight:bold; color:#2E8B57; font-size:20px;'>Ranking de Coletores</p>",
         unsafe_allow_html=True
@@ -550,28 +1430,13 @@ elif menu == "Ranking":
         if data_inicial > data_final:
             st.error("❌ A data inicial não pode ser maior que a data final.")
         else:
-            df_pesagens = get_data("pesagens")
-            df_coletores = get_data("coletores")
-            if df_pesagens.empty or df_coletores.empty:
-                st.info("ℹ️ Ainda não há dados para gerar o ranking.")
+            df_ranking = calcular_ranking(data_inicial, data_final)
+            if df_ranking.empty:
+                st.warning("⚠️ Nenhuma pesagem encontrada nesse intervalo.")
             else:
-                df_pesagens["data_pesagem"] = pd.to_datetime(df_pesagens["data_pesagem"]).dt.date
-                df_filtrado = df_pesagens[
-                    (df_pesagens["data_pesagem"] >= data_inicial) &
-                    (df_pesagens["data_pesagem"] <= data_final)
-                ]
-                if df_filtrado.empty:
-                    st.warning("⚠️ Nenhuma pesagem encontrada nesse intervalo.")
-                else:
-                    df_ranking = (
-                        df_filtrado.merge(df_coletores, on="id_coletor")
-                        .groupby("nome_completo")["peso"]
-                        .sum()
-                        .reset_index()
-                        .rename(columns={"nome_completo": "Coletor", "peso": "Total (kg)"})
-                        .sort_values(by="Total (kg)", ascending=False)
-                    )
-                    st.dataframe(df_ranking, use_container_width=True)
+                st.dataframe(df_ranking, use_container_width=True)
+                st.subheader("♻️ Totais por material")
+                st.dataframe(calcular_totais_por_material(data_inicial, data_final), use_container_width=True)
 # ======================================
 # Sorteio
 # ======================================
@@ -583,33 +1448,101 @@ elif menu == "Sorteio":
     )
 
     qtd = st.number_input("Quantos protocolos sortear?", min_value=1, step=1)
+    tipo_sorteio = st.radio(
+        "Chances por protocolo",
+        ["Um bilhete por protocolo", "Proporcional ao peso (kg)"],
+        horizontal=True
+    )
+    ponderado = tipo_sorteio == "Proporcional ao peso (kg)"
+    # O sorteio ponderado é sempre feito no app, então sempre leva semente
+    auditavel = st.checkbox("Sorteio auditável (semente registrada)", value=True, disabled=ponderado) or ponderado
+
+    # A semente é gerada antes e só o seu hash é mostrado: quem acompanha o
+    # sorteio anota o compromisso e confere com a semente revelada depois.
+    if "semente_sorteio" not in st.session_state:
+        st.session_state["semente_sorteio"] = gerar_semente()
+    if auditavel:
+        st.caption(f"Compromisso da semente (SHA-256): `{compromisso_semente(st.session_state['semente_sorteio'])}`")
+
     if st.button("🎯 Realizar sorteio"):
-        sortear_protocolo(qtd)
+        sortear_protocolo(qtd, ponderado=ponderado, semente=st.session_state["semente_sorteio"] if auditavel else None)
+        st.session_state.pop("semente_sorteio")
 
     st.markdown("---")
     st.markdown("### 📜 Histórico de Sorteios")
 
-    query = supabase.table("sorteios")\
-        .select("numero_sorteio, numero_protocolo, data_sorteio, pesagens(coletores(nome_completo, telefone_celular))")\
-        .order("numero_sorteio", desc=True)\
-        .execute()
+    df_historico = carregar_historico_sorteios()
 
-    if query.data:
-        df = pd.DataFrame(query.data)
-        df_fmt = pd.DataFrame([{
-            "Sorteio nº": row["numero_sorteio"],
-            "Protocolo": row["numero_protocolo"],
-            "Nome": row["pesagens"]["coletores"]["nome_completo"],
-            "Telefone": f"({row['pesagens']['coletores']['telefone_celular'][:2]}) "
-                        f"{row['pesagens']['coletores']['telefone_celular'][2:7]}-"
-                        f"{row['pesagens']['coletores']['telefone_celular'][7:]}",
-            "Data do Sorteio": row["data_sorteio"].split("T")[0]
-        } for _, row in df.iterrows()])
-
-        st.dataframe(df_fmt, use_container_width=True)
+    if not df_historico.empty:
+        df_paginado = paginate_dataframe(df_historico, page_size=20, key_prefix="sorteios")
+        st.dataframe(df_paginado, use_container_width=True)
     else:
         st.info("Nenhum sorteio realizado ainda.")
 
+# ======================================
+# Painel
+# ======================================
+
+elif menu == "Painel":
+    st.markdown(
+        "<p style='font-weight:bold; color:#2E8B57; font-size:20px;'>Painel</p>",
+        unsafe_allow_html=True
+    )
+
+    hoje = datetime.date.today()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        painel_inicio = st.date_input("Data inicial", primeiro_dia_do_mes(hoje - datetime.timedelta(days=365)), key="painel_inicio")
+    with col2:
+        painel_fim = st.date_input("Data final", hoje, key="painel_fim")
+    with col3:
+        agrupamento = st.radio("Agrupar por", ["Dia", "Semana", "Mês"], index=2, horizontal=True)
+
+    if painel_inicio > painel_fim:
+        st.error("❌ A data inicial não pode ser maior que a data final.")
+    else:
+        diario, mensal = carregar_painel(painel_inicio, painel_fim)
+
+        if diario.empty:
+            st.info("Nenhuma pesagem encontrada nesse intervalo.")
+        else:
+            df_materiais = get_reference_data("materiais")
+            nomes_materiais = dict(zip(df_materiais["id_material"], df_materiais["nome_material"])) if not df_materiais.empty else {}
+            diario = diario.assign(Material=diario["id_material"].map(nomes_materiais).fillna("Outros"))
+
+            # Contagens do intervalo exato (as linhas mensais cobrem meses inteiros)
+            protocolos = int(diario["quantidade"].sum())
+            sorteados = int(diario["sorteados"].sum())
+            ultimo_mes = mensal.sort_values("mes").iloc[-1]
+
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Total (kg)", f"{diario['total_kg'].sum():.1f}")
+            m2.metric("Pesagens", protocolos)
+            m3.metric(f"Coletores ativos ({ultimo_mes['mes']:%m/%Y})", int(ultimo_mes["coletores_ativos"]))
+            m4.metric("Protocolos sorteados", f"{100 * sorteados / protocolos:.1f}%" if protocolos else "—")
+
+            frequencia = {"Dia": "D", "Semana": "W-MON", "Mês": "MS"}[agrupamento]
+            por_periodo = diario.assign(Periodo=pd.to_datetime(diario["dia"]))\
+                .pivot_table(index="Periodo", columns="Material", values="total_kg", aggfunc="sum")\
+                .resample(frequencia, label="left", closed="left").sum()
+
+            st.subheader("⚖️ Peso por período (kg)")
+            st.bar_chart(por_periodo)
+
+            st.subheader("♻️ Peso por material (kg)")
+            st.bar_chart(diario.groupby("Material")["total_kg"].sum().sort_values(ascending=False))
+
+            st.subheader("👥 Coletores ativos e participação no sorteio")
+            st.line_chart(
+                mensal.assign(Mes=pd.to_datetime(mensal["mes"])).set_index("Mes")
+                .rename(columns={"coletores_ativos": "Coletores ativos", "coletores_sorteados": "Coletores sorteados"})
+                [["Coletores ativos", "Coletores sorteados"]]
+            )
+
+        if st.button("🔄 Atualizar painel"):
+            invalidar_painel()
+            st.rerun()
+
 
 # ======================================
 # Rodapé
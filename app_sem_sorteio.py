@@ -1,10 +1,14 @@
 import streamlit as st
-from supabase import create_client, Client
+from supabase import Client
 from postgrest.exceptions import APIError
-from dotenv import load_dotenv
-import os
 import pandas as pd
-import re
+from alteracoes import salvar_alteracoes
+from conexao import obter_cliente
+from referencias import (
+    TABELAS_REFERENCIA, filtrar_por_nome, get_data, get_reference_data,
+    invalidar_referencias, seletor_por_nome
+)
+from telefone import DIGITOS_CELULAR, formatar_telefones, normalizar_telefone
 
 # ======================================
 # Configurações Iniciais
@@ -15,38 +19,22 @@ st.title("♻️ Sistema de Coleta Seletiva")
 # ======================================
 # Conexão com Supabase
 # ======================================
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Cliente único do processo: as conexões HTTP sobrevivem aos reruns
+supabase: Client = obter_cliente()
 
 # ======================================
 # Funções Auxiliares
 # ======================================
-def get_data(table_name):
-    response = supabase.table(table_name).select("*").execute()
-    if response.data:
-        return pd.DataFrame(response.data)
-    return pd.DataFrame()
-
 def insert_data(table_name, data, success_msg="✅ Registro inserido com sucesso!"):
     try:
         supabase.table(table_name).insert(data).execute()
+        if table_name in TABELAS_REFERENCIA:
+            invalidar_referencias()
         st.success(success_msg)
         st.rerun()
     except APIError as e:
         st.error(f"❌ Erro ao inserir: {e}")
 
-def formatar_celular(valor):
-    if pd.isna(valor):
-        return ""
-    apenas_numeros = re.sub(r"\D", "", str(valor))
-    if len(apenas_numeros) == 11:
-        return f"({apenas_numeros[:2]}) {apenas_numeros[2:7]}-{apenas_numeros[7:]}"
-    elif len(apenas_numeros) == 10:
-        return f"({apenas_numeros[:2]}) {apenas_numeros[2:6]}-{apenas_numeros[6:]}"
-    return valor
-
 # ======================================
 # Função de Paginação
 # ======================================
@@ -122,20 +110,20 @@ if menu == "Coletores":
         "<p style='font-weight:bold; color:#2E8B57; font-size:20px;'>Cadastro de Coletores</p>",
         unsafe_allow_html=True
     )
-    df_coletores = get_data("coletores")
+    df_coletores = get_reference_data("coletores")
 
     with st.form("add_coletor"):
         nome = st.text_input("Nome completo do coletor")
         endereco = st.text_input("Endereço")
         telefone = st.text_input("Telefone (apenas números, ex: 31999999999)")
-        telefone = ''.join(filter(str.isdigit, telefone))
+        telefone = normalizar_telefone(telefone)
 
         submitted = st.form_submit_button("Salvar coletor")
 
         if submitted:
             if not nome:
                 st.error("❌ O nome é obrigatório.")
-            elif len(telefone) != 11:
+            elif len(telefone) != DIGITOS_CELULAR:
                 st.error("❌ O telefone deve ter exatamente 11 dígitos (DDD + número).")
             else:
                 insert_data("coletores", {
@@ -151,11 +139,11 @@ if menu == "Coletores":
             "endereco": "Endereço",
             "telefone_celular": "Telefone"
         })
-        df["Telefone"] = df["Telefone"].apply(formatar_celular)
+        df["Telefone"] = formatar_telefones(df["Telefone"])
 
         filtro_nome = st.text_input("🔎 Filtrar por nome do coletor")
         if filtro_nome:
-            df = df[df["Nome"].str.contains(filtro_nome, case=False, na=False)]
+            df = filtrar_por_nome(df, "ID", "coletores", filtro_nome)
 
         df_paginado = paginate_dataframe(df, key_prefix="coletores")
 
@@ -165,17 +153,17 @@ if menu == "Coletores":
         if not df_paginado.equals(df_edit):
             if st.button("💾 Salvar alterações"):
                 try:
-                    for i in range(len(df_edit)):
-                        old = df_paginado.iloc[i]
-                        new = df_edit.iloc[i]
-                        if not old.equals(new):
-                            supabase.table("coletores").update({
-                                "nome_completo": new["Nome"],
-                                "endereco": new["Endereço"],
-                                "telefone_celular": new["Telefone"]
-                            }).eq("id_coletor", new["ID"]).execute()
-                    st.success("✅ Alterações salvas!")
-                    st.rerun()
+                    _, conflitos = salvar_alteracoes(
+                        supabase, "coletores", df_paginado, df_edit, "ID",
+                        {"ID": "id_coletor", "Nome": "nome_completo", "Endereço": "endereco", "Telefone": "telefone_celular"},
+                        conversores={"telefone_celular": normalizar_telefone}
+                    )
+                    invalidar_referencias()
+                    if conflitos.empty:
+                        st.success("✅ Alterações salvas!")
+                        st.rerun()
+                    st.warning("⚠️ Algumas linhas foram alteradas por outra estação e não foram gravadas:")
+                    st.dataframe(conflitos, use_container_width=True)
                 except Exception as e:
                     st.error(f"❌ Erro ao salvar alterações: {e}")
 
@@ -187,7 +175,7 @@ elif menu == "Materiais":
         "<p style='font-weight:bold; color:#2E8B57; font-size:20px;'>Cadastro de Materiais</p>",
         unsafe_allow_html=True
     )
-    df_materiais = get_data("materiais")
+    df_materiais = get_reference_data("materiais")
 
     with st.form("add_material"):
         nome = st.text_input("Nome do material")
@@ -212,7 +200,7 @@ elif menu == "Materiais":
 
         filtro_nome = st.text_input("🔎 Filtrar por nome do material")
         if filtro_nome:
-            df = df[df["Nome"].str.contains(filtro_nome, case=False, na=False)]
+            df = filtrar_por_nome(df, "ID", "materiais", filtro_nome)
 
         df_paginado = paginate_dataframe(df, key_prefix="materiais")
 
@@ -222,17 +210,16 @@ elif menu == "Materiais":
         if not df_paginado.equals(df_edit):
             if st.button("💾 Salvar alterações"):
                 try:
-                    for i in range(len(df_edit)):
-                        old = df_paginado.iloc[i]
-                        new = df_edit.iloc[i]
-                        if not old.equals(new):
-                            supabase.table("materiais").update({
-                                "nome_material": new["Nome"],
-                                "descricao": new["Descrição"],
-                                "tipo_pesagem": new["Unidade"]
-                            }).eq("id_material", new["ID"]).execute()
-                    st.success("✅ Alterações salvas!")
-                    st.rerun()
+                    _, conflitos = salvar_alteracoes(
+                        supabase, "materiais", df_paginado, df_edit, "ID",
+                        {"ID": "id_material", "Nome": "nome_material", "Descrição": "descricao", "Unidade": "tipo_pesagem"}
+                    )
+                    invalidar_referencias()
+                    if conflitos.empty:
+                        st.success("✅ Alterações salvas!")
+                        st.rerun()
+                    st.warning("⚠️ Algumas linhas foram alteradas por outra estação e não foram gravadas:")
+                    st.dataframe(conflitos, use_container_width=True)
                 except Exception as e:
                     st.error(f"❌ Erro ao salvar alterações: {e}")
 
@@ -242,25 +229,27 @@ elif menu == "Materiais":
 elif menu == "Pesagens":
     st.markdown("<p style='font-weight:bold; color:#2E8B57; font-size:20px;'>Registro de Pesagens</p>", unsafe_allow_html=True)
 
-    df_coletores = get_data("coletores")
-    df_materiais = get_data("materiais")
+    df_coletores = get_reference_data("coletores")
+    df_materiais = get_reference_data("materiais")
 
     if df_coletores.empty or df_materiais.empty:
         st.warning("Cadastre coletores e materiais antes de registrar pesagens.")
     else:
-        coletores_dict = dict(zip(df_coletores["id_coletor"], df_coletores["nome_completo"]))
-        materiais_dict = dict(zip(df_materiais["id_material"], df_materiais["nome_material"]))
+        # A busca fica fora do formulário para atualizar as opções a cada digitação
+        col_coletor, col_material = st.columns(2)
+        with col_coletor:
+            id_coletor = seletor_por_nome("Coletor", "coletores", key="pesagem_coletor")
+        with col_material:
+            id_material = seletor_por_nome("Material", "materiais", key="pesagem_material")
 
         with st.form("add_pesagem"):
-            coletor = st.selectbox("Coletor", list(coletores_dict.values()))
-            material = st.selectbox("Material", list(materiais_dict.values()))
             peso = st.number_input("Peso", min_value=0.0, step=0.1)
             data_pesagem = st.date_input("Data da pesagem")
             submitted = st.form_submit_button("Registrar pesagem")
 
-            if submitted:
-                id_coletor = next(k for k, v in coletores_dict.items() if v == coletor)
-                id_material = next(k for k, v in materiais_dict.items() if v == material)
+            if submitted and (id_coletor is None or id_material is None):
+                st.error("❌ Selecione o coletor e o material.")
+            elif submitted:
                 insert_data("pesagens", {
                     "id_coletor": id_coletor,
                     "id_material": id_material,
@@ -366,9 +355,11 @@ elif menu == "Ranking":
                     {"data_inicial": str(data_inicial), "data_final": str(data_final)}
                 ).execute()
                 df_ranking = pd.DataFrame(query.data) if query.data else pd.DataFrame()
+                if not df_ranking.empty:
+                    df_ranking = df_ranking.rename(columns={"coletor": "Coletor", "total_kg": "Total (kg)"})[["Coletor", "Total (kg)"]]
             except Exception:
                 df_pesagens = get_data("pesagens")
-                df_coletores = get_data("coletores")
+                df_coletores = get_reference_data("coletores")
 
                 if df_pesagens.empty or df_coletores.empty:
                     st.info("ℹ️ Ainda não há dados para gerar o ranking.")
@@ -0,0 +1,67 @@
+# benchmarks/bench_telefone.py
+"""Compara o tratamento de telefones linha a linha (apply) com o módulo telefone.
+
+    python benchmarks/bench_telefone.py [quantidade]
+"""
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import telefone  # noqa: E402
+
+
+def formatar_celular(valor):
+    """Implementação anterior, aplicada linha a linha com Series.apply."""
+    if pd.isna(valor):
+        return ""
+    apenas_numeros = re.sub(r"\D", "", str(valor))
+    if len(apenas_numeros) == 11:
+        return f"({apenas_numeros[:2]}) {apenas_numeros[2:7]}-{apenas_numeros[7:]}"
+    elif len(apenas_numeros) == 10:
+        return f"({apenas_numeros[:2]}) {apenas_numeros[2:6]}-{apenas_numeros[6:]}"
+    return valor
+
+
+def gerar_telefones(quantidade, semente=0):
+    """Telefones como no banco (só dígitos), com 10% digitados com máscara e alguns nulos."""
+    rng = np.random.default_rng(semente)
+    serie = pd.Series(rng.integers(10**10, 10**11, quantidade).astype(str), dtype=object)
+    serie[::10] = "(" + serie[::10].str[:2] + ") " + serie[::10].str[2:7] + "-" + serie[::10].str[7:]
+    serie[::997] = None
+    return serie
+
+
+def medir(nome, funcao, serie, repeticoes=3):
+    melhor = min(_tempo(funcao, serie) for _ in range(repeticoes))
+    print(f"{nome:<28} {melhor:8.3f} s   {len(serie) / melhor / 1e6:6.2f} M telefones/s")
+    return melhor
+
+
+def _tempo(funcao, serie):
+    inicio = time.perf_counter()
+    funcao(serie)
+    return time.perf_counter() - inicio
+
+
+def main(quantidade=1_000_000):
+    serie = gerar_telefones(quantidade)
+    assert telefone.formatar_telefones(serie).equals(serie.apply(formatar_celular).astype(object))
+
+    print(f"Formatação de {quantidade:,} telefones")
+    por_linha = medir("apply(formatar_celular)", lambda s: s.apply(formatar_celular), serie)
+    vetorizado = medir("formatar_telefones", telefone.formatar_telefones, serie)
+    print(f"Ganho: {por_linha / vetorizado:.1f}x")
+
+    print(f"\nNormalização de {quantidade:,} telefones")
+    por_linha = medir("apply(join(filter(isdigit)))", lambda s: s.fillna("").astype(str).apply(lambda v: "".join(filter(str.isdigit, v))), serie)
+    vetorizado = medir("normalizar_telefones", telefone.normalizar_telefones, serie)
+    print(f"Ganho: {por_linha / vetorizado:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,108 @@
+# busca.py
+"""Busca por nome sem diferenciar acentos nem maiúsculas ("João" encontra "joao").
+
+O índice é montado uma vez a partir da tabela de referência (coletores ou
+materiais) e fica no cache compartilhado do app; cada busca consulta só os
+nomes candidatos em vez de percorrer a tabela inteira.
+"""
+import heapq
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+
+def normalizar_nome(texto):
+    """Minúsculas, sem acentos e com espaços simples."""
+    decomposto = unicodedata.normalize("NFKD", str(texto or ""))
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())
+
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceNomes:
+    """Índice de trigramas (buscas com 3+ letras) e de prefixos de palavras (1 ou 2 letras).
+
+    Guarda também o mapa id <-> nome, para que seletores carreguem o id
+    diretamente. `rotulos` é o texto exibido em cada opção (por exemplo, nome
+    e telefone, para distinguir homônimos); por padrão, o próprio nome.
+    """
+
+    def __init__(self, ids, nomes, rotulos=None):
+        self.ids = list(ids)
+        self.nomes = list(nomes)
+        self.rotulos = list(rotulos) if rotulos is not None else self.nomes
+        self.posicao_por_id = {id_: posicao for posicao, id_ in enumerate(self.ids)}
+        self.normalizados = [normalizar_nome(n) for n in self.nomes]
+
+        self.trigramas = defaultdict(lambda: array("i"))
+        palavras = []
+        for posicao, nome in enumerate(self.normalizados):
+            for trigrama in _trigramas(nome):
+                self.trigramas[trigrama].append(posicao)
+            palavras.extend((palavra, posicao) for palavra in set(nome.split()))
+        self.trigramas = dict(self.trigramas)
+        palavras.sort()
+        self.palavras = [p for p, _ in palavras]
+        self.posicoes_palavras = array("i", (pos for _, pos in palavras))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nome(self, id_):
+        return self.nomes[self.posicao_por_id[id_]]
+
+    def rotulo(self, id_):
+        return self.rotulos[self.posicao_por_id[id_]]
+
+    def _candidatos(self, consulta):
+        if len(consulta) >= 3:
+            listas = []
+            for trigrama in _trigramas(consulta):
+                if trigrama not in self.trigramas:
+                    return set()
+                listas.append(self.trigramas[trigrama])
+            listas.sort(key=len)
+            candidatos = set(listas[0])
+            for lista in listas[1:]:
+                candidatos.intersection_update(lista)
+                if not candidatos:
+                    break
+            return {p for p in candidatos if consulta in self.normalizados[p]}
+
+        inicio = bisect_left(self.palavras, consulta)
+        fim = bisect_left(self.palavras, consulta + "￿")
+        return set(self.posicoes_palavras[inicio:fim])
+
+    def buscar(self, consulta, limite=None):
+        """Posições (na ordem da tabela indexada) dos nomes que contêm `consulta`.
+
+        Nomes que começam pela consulta vêm primeiro, depois os que têm uma
+        palavra começando por ela e por fim os demais, cada grupo em ordem
+        alfabética.
+        """
+        consulta = normalizar_nome(consulta)
+        if not consulta:
+            posicoes = range(len(self.ids))
+            return list(posicoes[:limite] if limite else posicoes)
+
+        def relevancia(posicao):
+            nome = self.normalizados[posicao]
+            if nome.startswith(consulta):
+                grupo = 0
+            elif f" {consulta}" in nome:
+                grupo = 1
+            else:
+                grupo = 2
+            return grupo, nome
+
+        candidatos = self._candidatos(consulta)
+        if limite:
+            return heapq.nsmallest(limite, candidatos, key=relevancia)
+        return sorted(candidatos, key=relevancia)
+
+    def buscar_ids(self, consulta, limite=None):
+        return [self.ids[p] for p in self.buscar(consulta, limite)]
@@ -0,0 +1,241 @@
+# comprovante.py
+"""Comprovantes de pesagem para impressora térmica 80mm.
+
+Dois formatos de saída: PDF (altura da página calculada pelo conteúdo) e
+ESC/POS cru, enviado direto para a impressora por arquivo de dispositivo
+(/dev/usb/lp0, um arquivo comum para testes) ou socket (host:9100).
+
+Não depende do Streamlit: as funções de lote podem rodar em processos
+separados (ProcessPoolExecutor) para lotes grandes.
+"""
+import datetime
+import multiprocessing
+import socket
+import textwrap
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.units import cm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+
+LARGURA = 8*cm     # largura típica de impressora térmica
+
+# A partir deste tamanho o ZIP é renderizado em paralelo, em blocos por processo
+LIMITE_PARALELO = 200
+TAMANHO_BLOCO = 50
+
+
+# ======================================
+# Layout, calculado uma única vez
+# ======================================
+MARGEM = 0.2*cm
+MARGEM_INFERIOR = 0.6*cm
+
+# Cabeçalho: distâncias a partir do topo da página
+CABECALHO = [
+    (1.0*cm, "Helvetica-Bold", 10, colors.black, "♻️ SISTEMA DE COLETA SELETIVA"),
+    (1.6*cm, "Helvetica", 9, colors.black, "Comprovante de Pesagem"),
+]
+LINHA_DIVISORIA = 2.0*cm
+
+# Campos variáveis: só eles são desenhados a cada comprovante, quebrando
+# linhas longas (nome do coletor, por exemplo) na largura do papel
+INICIO_CAMPOS = 2.6*cm
+ENTRELINHA_CAMPOS = 0.5*cm
+FONTE_CAMPOS = ("Helvetica", 9)
+CAMPOS = [
+    "Protocolo: {protocolo}",
+    "Data: {data}",
+    "Coletor: {coletor}",
+    "Material: {material}",
+    "Peso: {peso} kg",
+]
+
+# Rodapé: distâncias a partir do último campo
+RODAPE = [
+    (0.6*cm, "Helvetica-Bold", 9, colors.black, "Guarde este comprovante, seu protocolo é o seu"),
+    (1.1*cm, "Helvetica-Bold", 9, colors.black, "número da Sorte para nossos sorteios!"),
+    (2.1*cm, "Helvetica-Oblique", 7, colors.gray, "Emitido automaticamente pelo Sistema de Coleta Seletiva"),
+    (2.5*cm, "Helvetica-Oblique", 7, colors.gray, "Desenvolvido por Leticia Freitas © {ano}"),
+]
+
+
+def linhas_campos(dados, largura=LARGURA):
+    """Linhas dos campos variáveis já quebradas na largura útil do papel."""
+    linhas = []
+    for campo in CAMPOS:
+        linhas.extend(simpleSplit(campo.format(**dados), *FONTE_CAMPOS, largura - 2*MARGEM))
+    return linhas
+
+
+def altura_comprovante(linhas):
+    """Altura exata da página para um comprovante com essas linhas de campos."""
+    ultimo_campo = INICIO_CAMPOS + (len(linhas) - 1) * ENTRELINHA_CAMPOS
+    return ultimo_campo + RODAPE[-1][0] + MARGEM_INFERIOR
+
+
+def _desenhar_textos(c, textos, ano):
+    for distancia, fonte, tamanho, cor, texto in textos:
+        c.setFont(fonte, tamanho)
+        c.setFillColor(cor)
+        c.drawString(MARGEM, -distancia, texto.format(ano=ano))
+
+
+def _usar_modelo(c, nome, largura, origem_y, profundidade, desenhar):
+    """Desenha uma parte fixa como form XObject: definida uma vez por documento e reaproveitada.
+
+    O form é desenhado com origem em `origem_y` e distâncias negativas (até
+    `profundidade`) a partir dela, então serve para qualquer altura de página.
+    """
+    if not c.hasForm(nome):
+        c.beginForm(nome, lowerx=0, lowery=-profundidade, upperx=largura, uppery=0)
+        desenhar()
+        c.endForm()
+    c.saveState()
+    c.translate(0, origem_y)
+    c.doForm(nome)
+    c.restoreState()
+
+
+def desenhar_comprovante(c, dados, largura=LARGURA):
+    """Desenha um comprovante numa página nova do canvas, com a altura ajustada ao conteúdo."""
+    ano = datetime.date.today().year
+    linhas = linhas_campos(dados, largura)
+    altura = altura_comprovante(linhas)
+    c.setPageSize((largura, altura))
+
+    def cabecalho():
+        _desenhar_textos(c, CABECALHO, ano)
+        c.setStrokeColor(colors.green)
+        c.setLineWidth(1)
+        c.line(MARGEM, -LINHA_DIVISORIA, largura - MARGEM, -LINHA_DIVISORIA)
+
+    _usar_modelo(c, f"cabecalho_{int(largura)}", largura, altura, INICIO_CAMPOS, cabecalho)
+
+    c.setFont(*FONTE_CAMPOS)
+    c.setFillColor(colors.black)
+    y = altura - INICIO_CAMPOS
+    for linha in linhas:
+        c.drawString(MARGEM, y, linha)
+        y -= ENTRELINHA_CAMPOS
+
+    _usar_modelo(c, f"rodape_{ano}_{int(largura)}", largura, y + ENTRELINHA_CAMPOS, RODAPE[-1][0] + MARGEM_INFERIOR,
+                 lambda: _desenhar_textos(c, RODAPE, ano))
+    c.showPage()
+
+
+@lru_cache(maxsize=1024)
+def _pdf_comprovante(protocolo, data, coletor, material, peso, ano):
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(LARGURA, LARGURA))
+    desenhar_comprovante(c, {"protocolo": protocolo, "data": data, "coletor": coletor, "material": material, "peso": peso})
+    c.save()
+    return buffer.getvalue()
+
+
+def gerar_pdf_comprovante(dados):
+    """Gera um PDF de comprovante compacto para impressora térmica 80mm.
+
+    O PDF pronto fica em memória por protocolo (e conteúdo), então as
+    reexecuções do Streamlit que pedem o mesmo comprovante não o redesenham.
+    """
+    return BytesIO(_pdf_comprovante(
+        str(dados["protocolo"]), str(dados["data"]), str(dados["coletor"]),
+        str(dados["material"]), str(dados["peso"]), datetime.date.today().year
+    ))
+
+
+def gerar_pdf_lote(lista_dados, destino):
+    """Grava em `destino` (arquivo ou buffer) um único PDF com um comprovante por página."""
+    c = canvas.Canvas(destino, pagesize=(LARGURA, LARGURA))
+    for dados in lista_dados:
+        desenhar_comprovante(c, dados)
+    c.save()
+    return destino
+
+
+def _renderizar_bloco(bloco):
+    return [(f"comprovante_{dados['protocolo']}.pdf", gerar_pdf_comprovante(dados).getvalue()) for dados in bloco]
+
+
+def gerar_zip_comprovantes(lista_dados, destino, processos=None):
+    """Grava em `destino` um ZIP com um PDF por comprovante.
+
+    Cada arquivo entra no ZIP assim que fica pronto. Lotes grandes são
+    renderizados em blocos distribuídos entre processos, iniciados com spawn:
+    um fork copiaria as threads do servidor do Streamlit (e seus locks) para
+    os processos filhos.
+    """
+    blocos = [lista_dados[i:i + TAMANHO_BLOCO] for i in range(0, len(lista_dados), TAMANHO_BLOCO)]
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        if len(lista_dados) >= LIMITE_PARALELO:
+            with ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn")) as executor:
+                for pdfs in executor.map(_renderizar_bloco, blocos):
+                    for nome, conteudo in pdfs:
+                        arquivo_zip.writestr(nome, conteudo)
+        else:
+            for bloco in blocos:
+                for nome, conteudo in _renderizar_bloco(bloco):
+                    arquivo_zip.writestr(nome, conteudo)
+    return destino
+
+
+# ======================================
+# ESC/POS (impressão direta, sem PDF)
+# ======================================
+COLUNAS_ESCPOS = 48        # fonte A em papel de 80mm
+CODIFICACAO_ESCPOS = "cp860"  # tabela de caracteres portuguesa (ESC t 3)
+
+ESC_INICIAR = b"\x1b@"
+ESC_TABELA_PORTUGUES = b"\x1bt\x03"
+ESC_NEGRITO = b"\x1bE\x01"
+ESC_NORMAL = b"\x1bE\x00"
+ESC_CENTRO = b"\x1ba\x01"
+ESC_ESQUERDA = b"\x1ba\x00"
+GS_AVANCAR_E_CORTAR = b"\x1dVB\x03"
+
+
+def _texto_escpos(texto):
+    linhas = textwrap.wrap(texto, COLUNAS_ESCPOS) or [""]
+    return "\n".join(linhas).encode(CODIFICACAO_ESCPOS, errors="replace") + b"\n"
+
+
+def gerar_escpos(dados):
+    """Bytes ESC/POS do comprovante, prontos para enviar à impressora térmica."""
+    ano = datetime.date.today().year
+    saida = [ESC_INICIAR, ESC_TABELA_PORTUGUES, ESC_CENTRO, ESC_NEGRITO]
+    saida.append(_texto_escpos("SISTEMA DE COLETA SELETIVA"))
+    saida += [ESC_NORMAL, _texto_escpos("Comprovante de Pesagem"), _texto_escpos("-" * COLUNAS_ESCPOS)]
+    saida.append(ESC_ESQUERDA)
+    saida += [_texto_escpos(campo.format(**dados)) for campo in CAMPOS]
+    saida += [b"\n", ESC_NEGRITO]
+    saida.append(_texto_escpos("Guarde este comprovante, seu protocolo é o seu número da Sorte para nossos sorteios!"))
+    saida += [ESC_NORMAL, b"\n", ESC_CENTRO]
+    saida.append(_texto_escpos("Emitido automaticamente pelo Sistema de Coleta Seletiva"))
+    saida.append(_texto_escpos(f"Desenvolvido por Leticia Freitas (c) {ano}"))
+    saida.append(GS_AVANCAR_E_CORTAR)
+    return b"".join(saida)
+
+
+def enviar_para_impressora(conteudo, destino, timeout=5):
+    """Envia bytes crus para a impressora.
+
+    `destino` é "host:porta" (impressora de rede, normalmente porta 9100) ou
+    o caminho de um arquivo de dispositivo, como /dev/usb/lp0. Um arquivo
+    comum também serve, para testes: os bytes são acrescentados ao final.
+    """
+    host, separador, porta = destino.rpartition(":")
+    if separador and porta.isdigit() and "/" not in destino:
+        with socket.create_connection((host, int(porta)), timeout=timeout) as conexao:
+            conexao.sendall(conteudo)
+    else:
+        with open(destino, "ab") as dispositivo:
+            dispositivo.write(conteudo)
+
+
+def imprimir_comprovante(dados, destino):
+    enviar_para_impressora(gerar_escpos(dados), destino)
@@ -0,0 +1,129 @@
+# conexao.py
+"""Cliente Supabase único por processo, com conexões HTTP reaproveitadas.
+
+O Streamlit reexecuta o script a cada interação; criar o cliente no topo do
+script abria conexões (e handshakes TLS) novas a cada rerun. Aqui o cliente é
+criado uma vez por processo, sobre um httpx.Client com pool keep-alive, e é o
+mesmo para o app, o cadastro de senhas e os utilitários de linha de comando.
+
+Configuração (variáveis de ambiente, todas opcionais):
+    SUPABASE_POOL      conexões mantidas no pool (padrão 10)
+    SUPABASE_TIMEOUT   tempo limite de cada requisição, em segundos (padrão 10)
+    SUPABASE_KEEPALIVE segundos que uma conexão ociosa fica aberta (padrão 60)
+"""
+import os
+import threading
+import time
+from functools import lru_cache
+
+import httpx
+from dotenv import load_dotenv
+from postgrest.exceptions import APIError
+from supabase import Client, create_client
+from supabase.lib.client_options import SyncClientOptions
+
+try:
+    import h2  # noqa: F401  (HTTP/2 multiplexa as requisições numa só conexão)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+load_dotenv()
+TAMANHO_POOL = int(os.getenv("SUPABASE_POOL", "10"))
+TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+KEEPALIVE = float(os.getenv("SUPABASE_KEEPALIVE", "60"))
+# "Função não encontrada" no PostgREST (cache do esquema) e no Postgres
+FUNCAO_INEXISTENTE = ("PGRST202", "42883")
+
+
+class MetricasConexao:
+    """Contadores do cliente HTTP compartilhado (seguros entre threads).
+
+    `conexoes_abertas` e `handshakes_tls` vêm do rastreamento do httpcore: com
+    o pool funcionando, crescem bem menos que `requisicoes`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.erros = 0
+        self.conexoes_abertas = 0
+        self.handshakes_tls = 0
+        self.tempo_total = 0.0
+
+    def _somar(self, **valores):
+        with self._lock:
+            for nome, valor in valores.items():
+                setattr(self, nome, getattr(self, nome) + valor)
+
+    def _rastrear(self, evento, info):
+        if evento == "connection.connect_tcp.complete":
+            self._somar(conexoes_abertas=1)
+        elif evento == "connection.start_tls.complete":
+            self._somar(handshakes_tls=1)
+
+    def _ao_enviar(self, request):
+        request.extensions["trace"] = self._rastrear
+        request.extensions["inicio_metricas"] = time.perf_counter()
+
+    def _ao_receber(self, response):
+        inicio = response.request.extensions.get("inicio_metricas", time.perf_counter())
+        self._somar(
+            requisicoes=1,
+            erros=int(response.status_code >= 400),
+            tempo_total=time.perf_counter() - inicio
+        )
+
+    def resumo(self):
+        with self._lock:
+            return {
+                "requisicoes": self.requisicoes,
+                "erros": self.erros,
+                "conexoes_abertas": self.conexoes_abertas,
+                "handshakes_tls": self.handshakes_tls,
+                "latencia_media_ms": 1000 * self.tempo_total / self.requisicoes if self.requisicoes else 0.0
+            }
+
+
+def criar_http(tamanho_pool=TAMANHO_POOL, timeout=TIMEOUT, keepalive=KEEPALIVE, metricas=None):
+    """httpx.Client com pool keep-alive; registra as requisições em `metricas`, se houver."""
+    ganchos = {}
+    if metricas is not None:
+        ganchos = {"request": [metricas._ao_enviar], "response": [metricas._ao_receber]}
+    return httpx.Client(
+        http2=HTTP2,
+        timeout=httpx.Timeout(timeout),
+        limits=httpx.Limits(
+            max_connections=tamanho_pool,
+            max_keepalive_connections=tamanho_pool,
+            keepalive_expiry=keepalive
+        ),
+        follow_redirects=True,
+        event_hooks=ganchos
+    )
+
+
+@lru_cache(maxsize=None)
+def _cliente(url, chave):
+    metricas = MetricasConexao()
+    opcoes = SyncClientOptions(httpx_client=criar_http(metricas=metricas))
+    return create_client(url, chave, options=opcoes), metricas
+
+
+def obter_cliente(url=None, chave=None) -> Client:
+    """O cliente Supabase do processo (criado na primeira chamada)."""
+    return _cliente(url or os.getenv("SUPABASE_URL"), chave or os.getenv("SUPABASE_KEY"))[0]
+
+
+def metricas_conexao(url=None, chave=None):
+    """Resumo das métricas do cliente devolvido por `obter_cliente`."""
+    return _cliente(url or os.getenv("SUPABASE_URL"), chave or os.getenv("SUPABASE_KEY"))[1].resumo()
+
+
+def funcao_inexistente(erro):
+    """Indica se a RPC falhou por a função não existir (script de sql/ não aplicado).
+
+    Só nesse caso vale cair para a alternativa feita no app; os demais erros
+    da função (permissão, tipo, restrição, tempo de espera) devem aparecer.
+    """
+    return isinstance(erro, APIError) and str(erro.code) in FUNCAO_INEXISTENTE
@@ -0,0 +1,137 @@
+# exportacao.py
+"""Exportação de pesagens de um intervalo de datas para CSV ou Parquet.
+
+As pesagens são lidas em lotes por id_pesagem (paginação por chave, sem
+OFFSET) já com os nomes de coletor e material, e cada lote é gravado no
+destino assim que chega: a memória usada não depende do tamanho do período.
+Parquet exige o pyarrow, que é opcional.
+
+Uso na linha de comando:
+
+    python exportacao.py 2025-01-01 2025-01-31 pesagens_2025_01.csv
+    python exportacao.py 2025-01-01 2025-01-31 pesagens_2025_01.parquet
+"""
+import argparse
+import datetime
+import io
+import sys
+
+import pandas as pd
+
+from conexao import obter_cliente
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+LOTE_EXPORTACAO = 1000  # limite padrão de linhas por resposta do PostgREST
+CAMPOS = "id_pesagem, numero_protocolo, data_pesagem, peso, coletores(nome_completo), materiais(nome_material)"
+COLUNAS = ["ID", "Protocolo", "Data", "Coletor", "Material", "Peso (kg)"]
+FORMATOS = ("csv", "parquet")
+
+
+def ler_pesagens(client, data_inicial, data_final, id_coletor=None, lote=LOTE_EXPORTACAO):
+    """Gera DataFrames com as colunas de COLUNAS, um por lote, em ordem de id_pesagem."""
+    ultimo_id = None
+    while True:
+        query = client.table("pesagens")\
+            .select(CAMPOS)\
+            .gte("data_pesagem", str(data_inicial))\
+            .lte("data_pesagem", str(data_final))
+        if id_coletor is not None:
+            query = query.eq("id_coletor", id_coletor)
+        if ultimo_id is not None:
+            query = query.gt("id_pesagem", ultimo_id)
+        dados = query.order("id_pesagem").limit(lote).execute().data
+
+        if not dados:
+            return
+        df = pd.json_normalize(dados)
+        yield pd.DataFrame({
+            "ID": df["id_pesagem"],
+            "Protocolo": df["numero_protocolo"],
+            "Data": pd.to_datetime(df["data_pesagem"]).dt.date,
+            "Coletor": df.get("coletores.nome_completo"),
+            "Material": df.get("materiais.nome_material"),
+            "Peso (kg)": df["peso"].astype(float)
+        }, columns=COLUNAS)
+        if len(dados) < lote:
+            return
+        ultimo_id = dados[-1]["id_pesagem"]
+
+
+def exportar_csv(lotes, destino):
+    """Grava os lotes em `destino` (caminho ou arquivo binário) como um único CSV.
+
+    O BOM do UTF-8 faz o Excel reconhecer os acentos ao abrir o arquivo.
+    """
+    arquivo = open(destino, "wb") if isinstance(destino, str) else destino
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    linhas = 0
+    try:
+        cabecalho = True
+        for df in lotes:
+            df.to_csv(texto, index=False, header=cabecalho)
+            cabecalho = False
+            linhas += len(df)
+        if cabecalho:
+            texto.write(",".join(COLUNAS) + "\n")
+        texto.flush()
+    finally:
+        texto.detach()
+        if isinstance(destino, str):
+            arquivo.close()
+    return linhas
+
+
+def exportar_parquet(lotes, destino):
+    """Grava os lotes em `destino` como Parquet, um row group por lote."""
+    if not PARQUET_DISPONIVEL:
+        raise RuntimeError("Exportação em Parquet requer o pacote pyarrow (pip install pyarrow).")
+    esquema = pa.schema([
+        ("ID", pa.int64()),
+        ("Protocolo", pa.string()),
+        ("Data", pa.date32()),
+        ("Coletor", pa.string()),
+        ("Material", pa.string()),
+        ("Peso (kg)", pa.float64())
+    ])
+    linhas = 0
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for df in lotes:
+            escritor.write_table(pa.Table.from_pandas(df, schema=esquema, preserve_index=False))
+            linhas += len(df)
+    return linhas
+
+
+def exportar_pesagens(client, data_inicial, data_final, destino, formato="csv", id_coletor=None):
+    """Exporta as pesagens do intervalo para `destino`; devolve o número de linhas gravadas."""
+    lotes = ler_pesagens(client, data_inicial, data_final, id_coletor)
+    if formato == "parquet":
+        return exportar_parquet(lotes, destino)
+    return exportar_csv(lotes, destino)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta as pesagens de um intervalo de datas.")
+    parser.add_argument("data_inicial", type=datetime.date.fromisoformat, help="AAAA-MM-DD")
+    parser.add_argument("data_final", type=datetime.date.fromisoformat, help="AAAA-MM-DD")
+    parser.add_argument("destino", help="arquivo .csv ou .parquet")
+    parser.add_argument("--formato", choices=FORMATOS, help="padrão: pela extensão do destino")
+    args = parser.parse_args(argv)
+
+    formato = args.formato or ("parquet" if args.destino.lower().endswith(".parquet") else "csv")
+    if formato == "parquet" and not PARQUET_DISPONIVEL:
+        print("❌ Exportação em Parquet requer o pacote pyarrow (pip install pyarrow).")
+        return 1
+
+    linhas = exportar_pesagens(obter_cliente(), args.data_inicial, args.data_final, args.destino, formato)
+    print(f"✅ {linhas} pesagens exportadas para {args.destino}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+# fila.py
+"""Fila local de gravações para estações sem conexão estável.
+
+Cada pesagem (ou alteração de peso) que não pôde ir para o Supabase é anotada
+num arquivo de log só de acréscimos, com fsync, antes de o operador seguir
+para a próxima. Uma thread reenvia a fila em lotes quando a conexão volta,
+esperando cada vez mais entre as tentativas enquanto ela não volta.
+
+Cada pesagem leva uma chave de idempotência (uuid) gravada na coluna
+pesagens.chave_idempotencia (sql/fila.sql): reenviar o mesmo lote duas vezes
+não duplica nada. O protocolo também é definido na hora, a partir de um bloco
+reservado com antecedência (PoolProtocolos), então o comprovante impresso
+offline é o mesmo que fica no banco.
+
+Não depende do Streamlit.
+"""
+import datetime
+import json
+import os
+import random
+import threading
+import uuid
+
+import httpx
+from postgrest.exceptions import APIError
+
+ARQUIVO_FILA = "fila.jsonl"
+ARQUIVO_PROTOCOLOS = "protocolos.json"
+LOTE_REENVIO = 100
+ESPERA_INICIAL = 2    # segundos até a primeira nova tentativa
+ESPERA_MAXIMA = 300
+# Classes de SQLSTATE que não se resolvem tentando de novo (dado inválido,
+# violação de integridade): a gravação sai da fila como rejeitada.
+CLASSES_DEFINITIVAS = ("22", "23")
+# Classes de SQLSTATE que o PostgREST devolve como 5xx e que passam sozinhas
+# (conexão com o banco, conflito de transação, falta de recursos, banco
+# reiniciando), além dos PGRST00x (PostgREST sem conexão com o banco).
+CLASSES_TRANSITORIAS = ("08", "40", "53", "57")
+# Índice único de uma pesagem por coletor, material e dia (sql/pesagens.sql)
+RESTRICAO_PESAGEM_DIARIA = "pesagens_coletor_material_data_key"
+
+
+def erro_definitivo(erro):
+    """Indica se o erro vem do banco recusando o dado (não adianta reenviar)."""
+    codigo = str(getattr(erro, "code", None) or "")
+    return isinstance(erro, APIError) and len(codigo) == 5 and codigo[:2] in CLASSES_DEFINITIVAS
+
+
+def erro_de_conexao(erro):
+    """Falha de rede ou do servidor (5xx): a gravação deve ir (ou continuar) na fila.
+
+    Outros erros da API (permissão, token expirado, coluna inexistente) não
+    são de conexão: tentar de novo não resolve.
+    """
+    if isinstance(erro, httpx.TransportError):
+        return True
+    if not isinstance(erro, APIError):
+        return False
+    codigo = str(erro.code or "")
+    if len(codigo) == 3 and codigo.isdigit():  # resposta sem JSON: o código é o status HTTP
+        return int(codigo) >= 500
+    return codigo.startswith("PGRST00") or (len(codigo) == 5 and codigo[:2] in CLASSES_TRANSITORIAS)
+
+
+def reservar_bloco_protocolos(client, quantidade=1, ano_mes=None):
+    """Reserva `quantidade` protocolos consecutivos (AAMMXXXX) pela RPC reservar_protocolos."""
+    ano_mes = ano_mes or datetime.date.today().strftime("%y%m")  # Ex: 2511
+    response = client.rpc(
+        "reservar_protocolos",
+        {"p_ano_mes": ano_mes, "p_quantidade": quantidade}
+    ).execute()
+
+    ultimo = int(response.data)
+    return [f"{ano_mes}{str(n).zfill(4)}" for n in range(ultimo - quantidade + 1, ultimo + 1)]
+
+
+class SemProtocolos(Exception):
+    """Não há protocolos reservados para o mês e não foi possível reservar mais."""
+
+
+class PoolProtocolos:
+    """Protocolos do mês reservados com antecedência e guardados em disco.
+
+    Números não usados de um mês que já passou são descartados (ficam como
+    lacunas na numeração, como acontece quando uma gravação falha).
+    """
+
+    def __init__(self, caminho, tamanho_bloco=50, minimo=20):
+        self.caminho = caminho
+        self.tamanho_bloco = tamanho_bloco
+        self.minimo = minimo
+        self._lock = threading.Lock()
+        self._estado = {"ano_mes": None, "numeros": []}
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as arquivo:
+                self._estado = json.load(arquivo)
+
+    def _mes_atual(self):
+        ano_mes = datetime.date.today().strftime("%y%m")
+        if self._estado["ano_mes"] != ano_mes:
+            self._estado = {"ano_mes": ano_mes, "numeros": []}
+        return ano_mes
+
+    def _salvar(self):
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(self._estado, arquivo)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, self.caminho)
+
+    def disponiveis(self):
+        with self._lock:
+            self._mes_atual()
+            return len(self._estado["numeros"])
+
+    def reabastecer(self, client):
+        """Completa o pool com um bloco novo quando restam menos de `minimo` números."""
+        with self._lock:
+            ano_mes = self._mes_atual()
+            if len(self._estado["numeros"]) >= self.minimo:
+                return 0
+        bloco = reservar_bloco_protocolos(client, self.tamanho_bloco, ano_mes)
+        with self._lock:
+            if self._mes_atual() == ano_mes:
+                self._estado["numeros"].extend(bloco)
+                self._salvar()
+        return len(bloco)
+
+    def retirar(self):
+        """Próximo protocolo do mês, já removido do pool em disco."""
+        with self._lock:
+            self._mes_atual()
+            if not self._estado["numeros"]:
+                raise SemProtocolos("Nenhum protocolo reservado para este mês.")
+            protocolo = self._estado["numeros"].pop(0)
+            self._salvar()
+            return protocolo
+
+
+class FilaGravacoes:
+    """Log de gravações pendentes (arquivo JSON Lines só de acréscimos).
+
+    Cada linha é uma gravação {"chave", "operacao", "dados"} ou o resultado de
+    uma gravação já enviada {"chave", "resultado"}. Ao abrir, o log é relido e
+    as gravações sem resultado voltam a ficar pendentes.
+    """
+
+    def __init__(self, diretorio, pool=None):
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, ARQUIVO_FILA)
+        self.pool = pool or PoolProtocolos(os.path.join(diretorio, ARQUIVO_PROTOCOLOS))
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self.pendentes = {}
+        self.rejeitadas = []
+        self.offline = False
+        self.ultimo_erro = None
+        self._carregar()
+
+    def _carregar(self):
+        if not os.path.exists(self.caminho):
+            return
+        with open(self.caminho, encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    continue  # última linha cortada por queda de energia
+                if "operacao" in registro:
+                    self.pendentes[registro["chave"]] = registro
+                else:
+                    gravacao = self.pendentes.pop(registro["chave"], None)
+                    if gravacao and registro["resultado"] != "gravada":
+                        self.rejeitadas.append({**gravacao, **registro})
+        self._compactar()
+
+    def _compactar(self):
+        """Reescreve o log só com as pendentes e as rejeitadas (fora dele, só acréscimos)."""
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            for rejeitada in self.rejeitadas:
+                gravacao = {k: rejeitada[k] for k in ("chave", "operacao", "dados", "criada_em") if k in rejeitada}
+                resultado = {k: rejeitada.get(k) for k in ("chave", "resultado", "motivo")}
+                arquivo.write(json.dumps(gravacao) + "\n" + json.dumps(resultado) + "\n")
+            for gravacao in self.pendentes.values():
+                arquivo.write(json.dumps(gravacao) + "\n")
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, self.caminho)
+
+    def _anotar(self, registros):
+        with open(self.caminho, "a", encoding="utf-8") as arquivo:
+            for registro in registros:
+                arquivo.write(json.dumps(registro) + "\n")
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+    def enfileirar(self, operacao, dados, chave=None):
+        """Anota a gravação em disco e devolve a chave de idempotência."""
+        chave = chave or str(uuid.uuid4())
+        gravacao = {
+            "chave": chave,
+            "operacao": operacao,
+            "dados": dados,
+            "criada_em": datetime.datetime.now().isoformat()
+        }
+        with self._lock:
+            self._anotar([gravacao])
+            self.pendentes[chave] = gravacao
+        if not self.offline:  # offline, quem decide a próxima tentativa é a espera
+            self._acordar.set()
+        return chave
+
+    def _concluir(self, resultados):
+        """Registra {chave: (resultado, motivo)} no log e tira as gravações da fila."""
+        with self._lock:
+            self._anotar([{"chave": chave, "resultado": r, "motivo": m} for chave, (r, m) in resultados.items()])
+            for chave, (resultado, motivo) in resultados.items():
+                gravacao = self.pendentes.pop(chave, None)
+                if gravacao and resultado != "gravada":
+                    self.rejeitadas.append({**gravacao, "resultado": resultado, "motivo": motivo})
+
+    def descartar_rejeitadas(self):
+        """Esquece as gravações recusadas pelo banco, depois que o operador as conferiu."""
+        with self._lock:
+            self.rejeitadas = []
+            self._compactar()
+
+    # ------------------------------
+    # Reenvio
+    # ------------------------------
+    def _enviar_pesagens(self, client, gravacoes):
+        linhas = [{**g["dados"], "chave_idempotencia": g["chave"]} for g in gravacoes]
+        try:
+            client.table("pesagens")\
+                .upsert(linhas, on_conflict="chave_idempotencia", ignore_duplicates=True)\
+                .execute()
+            return {g["chave"]: ("gravada", None) for g in gravacoes}
+        except APIError as e:
+            if not erro_definitivo(e):
+                raise
+            if len(gravacoes) == 1:
+                # Só a regra de uma pesagem por coletor/material/dia é duplicidade
+                duplicada = e.code == "23505" and RESTRICAO_PESAGEM_DIARIA in f"{e.message} {e.details}"
+                resultado = "duplicada" if duplicada else "rejeitada"
+                return {gravacoes[0]["chave"]: (resultado, e.message)}
+        # Uma linha recusada derruba o lote inteiro: reenvia uma a uma
+        resultados = {}
+        for gravacao in gravacoes:
+            resultados.update(self._enviar_pesagens(client, [gravacao]))
+        return resultados
+
+    def _enviar_peso(self, client, gravacao):
+        """Grava o peso só se o banco ainda tem o peso anterior, como alteracoes.py."""
+        dados = gravacao["dados"]
+        query = client.table("pesagens").update({"peso": dados["peso"]}).eq("id_pesagem", dados["id_pesagem"])
+        if dados["peso_anterior"] is None:
+            query = query.is_("peso", "null")
+        else:
+            query = query.eq("peso", dados["peso_anterior"])
+        try:
+            if query.execute().data:
+                return {gravacao["chave"]: ("gravada", None)}
+            atual = client.table("pesagens").select("peso").eq("id_pesagem", dados["id_pesagem"]).execute().data
+        except APIError as e:
+            if not erro_definitivo(e):
+                raise
+            return {gravacao["chave"]: ("rejeitada", e.message)}
+
+        if not atual:
+            return {gravacao["chave"]: ("rejeitada", "Pesagem excluída")}
+        return {gravacao["chave"]: ("conflito", f"Peso alterado por outra estação para {atual[0]['peso']}")}
+
+    def reenviar(self, client, lote=LOTE_REENVIO):
+        """Envia as pendentes em ordem, em lotes; devolve quantas saíram da fila.
+
+        Gravações recusadas pelo banco saem da fila como rejeitadas; qualquer
+        outro erro interrompe o reenvio (as restantes ficam na fila).
+        """
+        enviadas = 0
+        while True:
+            with self._lock:
+                gravacoes = list(self.pendentes.values())[:lote]
+            if not gravacoes:
+                return enviadas
+
+            # Inserções consecutivas vão num único upsert; alterações, uma a uma
+            if gravacoes[0]["operacao"] == "inserir_pesagem":
+                bloco = []
+                for gravacao in gravacoes:
+                    if gravacao["operacao"] != "inserir_pesagem":
+                        break
+                    bloco.append(gravacao)
+                resultados = self._enviar_pesagens(client, bloco)
+            else:
+                resultados = self._enviar_peso(client, gravacoes[0])
+            self._concluir(resultados)
+            enviadas += len(resultados)
+
+    def iniciar(self, client, intervalo=30):
+        """Thread que reenvia a fila e mantém o pool de protocolos abastecido."""
+        if self._thread is not None:
+            return
+
+        def laco():
+            espera = ESPERA_INICIAL
+            while True:
+                # Sem protocolos novos a fila ainda pode ser enviada, e vice-versa
+                falha = None
+                try:
+                    self.pool.reabastecer(client)
+                except Exception as e:
+                    falha = e
+                try:
+                    self.reenviar(client)
+                except Exception as e:
+                    falha = e
+
+                if falha is None:
+                    self.offline = False
+                    self.ultimo_erro = None
+                    espera = ESPERA_INICIAL
+                    proxima = intervalo
+                else:  # tenta de novo, cada vez mais espaçado
+                    self.offline = erro_de_conexao(falha)
+                    self.ultimo_erro = str(falha)
+                    proxima = espera * random.uniform(0.5, 1.0)
+                    espera = min(espera * 2, ESPERA_MAXIMA)
+                self._acordar.wait(proxima)
+                self._acordar.clear()
+
+        self._thread = threading.Thread(target=laco, name="fila-gravacoes", daemon=True)
+        self._thread.start()
@@ -0,0 +1,91 @@
+# referencias.py
+"""Coletores e materiais em cache, com a busca por nome usada nos seletores.
+
+Compartilhado por app.py e app_sem_sorteio.py, para que as duas versões do app
+usem o mesmo cache, o mesmo índice de nomes e o mesmo seletor. O app com
+réplica local registra a sua com `usar_replica`; sem ela, as tabelas vêm do
+Supabase.
+"""
+import pandas as pd
+import streamlit as st
+
+from busca import IndiceNomes
+from conexao import obter_cliente
+from telefone import formatar_telefones
+
+# Coletores e materiais mudam pouco: ficam em cache compartilhado por todas as
+# sessões do processo e são descartados a cada escrita ou ao fim do TTL.
+TABELAS_REFERENCIA = ("coletores", "materiais")
+TTL_REFERENCIA = 300  # segundos
+
+# Índice de busca por nome (sem acentos) sobre as mesmas tabelas de referência
+COLUNAS_NOME = {
+    "coletores": ("id_coletor", "nome_completo"),
+    "materiais": ("id_material", "nome_material")
+}
+
+_obter_replica = lambda: None
+
+
+def usar_replica(obter_replica):
+    """Define a função que devolve a réplica local pronta (ou None)."""
+    global _obter_replica
+    _obter_replica = obter_replica
+
+
+def get_data(table_name):
+    response = obter_cliente().table(table_name).select("*").execute()
+    if response.data:
+        return pd.DataFrame(response.data)
+    return pd.DataFrame()
+
+
+@st.cache_data(ttl=TTL_REFERENCIA, show_spinner=False)
+def get_reference_data(table_name):
+    replica = _obter_replica()
+    if replica is not None:
+        return replica.referencia(table_name)
+    return get_data(table_name)
+
+
+@st.cache_resource(ttl=TTL_REFERENCIA, show_spinner=False)
+def get_indice_nomes(table_name):
+    coluna_id, coluna_nome = COLUNAS_NOME[table_name]
+    df = get_reference_data(table_name)
+    if df.empty:
+        return IndiceNomes([], [])
+    rotulos = None
+    if table_name == "coletores":
+        # Nome + telefone é único: distingue coletores homônimos nos seletores
+        rotulos = df[coluna_nome].astype(str) + " · " + formatar_telefones(df["telefone_celular"])
+    return IndiceNomes(df[coluna_id], df[coluna_nome], rotulos)
+
+
+def filtrar_por_nome(df, coluna_id, table_name, consulta):
+    """Linhas de `df` cujo nome casa com a consulta, na ordem de relevância da busca."""
+    ordem = {id_: i for i, id_ in enumerate(get_indice_nomes(table_name).buscar_ids(consulta))}
+    return df[df[coluna_id].isin(ordem)].sort_values(coluna_id, key=lambda ids: ids.map(ordem))
+
+
+def seletor_por_nome(rotulo, table_name, key, opcional=False, limite=50):
+    """Busca por nome + selectbox com os melhores resultados; devolve o id escolhido.
+
+    Só as `limite` melhores opções vão para o navegador, e o id vem direto do
+    índice, sem procurar o nome de volta na tabela.
+    """
+    indice = get_indice_nomes(table_name)
+    busca = st.text_input(f"🔎 Buscar {rotulo.lower()}", key=f"{key}_busca")
+    opcoes = indice.buscar_ids(busca, limite)
+    if opcional:
+        opcoes = [None] + opcoes
+    return st.selectbox(
+        rotulo,
+        opcoes,
+        format_func=lambda id_: "Todos" if id_ is None else indice.rotulo(id_),
+        key=key
+    )
+
+
+def invalidar_referencias():
+    get_reference_data.clear()
+    get_indice_nomes.clear()
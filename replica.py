@@ -0,0 +1,330 @@
+# replica.py
+"""Réplica local (SQLite) de coletores, materiais, pesagens e sorteios.
+
+Para estações com internet instável: uma thread copia do Supabase só o que
+mudou desde a última sincronização, e listagem, contagem, ranking e tabelas de
+referência passam a ser consultas locais. As gravações continuam indo para o
+Supabase, e cada uma antecipa a próxima sincronização.
+
+Coletores, materiais e pesagens são copiados pela coluna atualizado_em
+(sql/replica.sql); sorteios, que nunca mudam depois de gravados, pelo
+numero_sorteio. Exclusões chegam pela tabela exclusoes, preenchida por gatilho
+no Supabase (sql/replica.sql) e copiada como as demais. A sincronização
+completa relê tudo e também remove o que sumiu por outros caminhos:
+
+    python replica.py caminho/da/replica.sqlite --completa
+"""
+import argparse
+import datetime
+import json
+import sqlite3
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from conexao import obter_cliente
+
+LOTE_SINCRONIZACAO = 1000  # limite padrão de linhas por resposta do PostgREST
+# Gravações de transações longas podem ficar com atualizado_em anterior ao
+# cursor; cada sincronização relê esse intervalo (as linhas são regravadas).
+MARGEM_SINCRONIZACAO = datetime.timedelta(minutes=5)
+
+# tabela -> (chave, cursor, colunas lidas do Supabase)
+TABELAS = {
+    "coletores": ("id_coletor", "atualizado_em", "*"),
+    "materiais": ("id_material", "atualizado_em", "*"),
+    "pesagens": (
+        "id_pesagem", "atualizado_em",
+        "id_pesagem, id_coletor, id_material, peso, data_pesagem, numero_protocolo, sorteado, atualizado_em"
+    ),
+    "sorteios": ("numero_sorteio", "numero_sorteio", "*"),
+    # Por último: uma exclusão lida aqui já não volta na cópia das tabelas acima
+    "exclusoes": ("id_exclusao", "excluida_em", "*")
+}
+
+ESQUEMA = """
+create table if not exists coletores (
+    id_coletor integer primary key,
+    nome_completo text,
+    dados text not null
+);
+create table if not exists materiais (
+    id_material integer primary key,
+    nome_material text,
+    dados text not null
+);
+create table if not exists pesagens (
+    id_pesagem integer primary key,
+    id_coletor integer,
+    id_material integer,
+    peso real,
+    data_pesagem text,
+    numero_protocolo text,
+    sorteado integer
+);
+create index if not exists pesagens_data_idx on pesagens (data_pesagem);
+create index if not exists pesagens_coletor_idx on pesagens (id_coletor, data_pesagem);
+create table if not exists sorteios (
+    numero_sorteio integer primary key,
+    id_pesagem integer,
+    numero_protocolo text,
+    data_sorteio text,
+    dados text not null
+);
+create table if not exists sincronizacao (
+    tabela text primary key,
+    cursor text,
+    chave integer,
+    sincronizado_em text not null
+);
+"""
+
+
+def _gravar_linhas(conexao, tabela, linhas):
+    """Insere ou substitui as linhas recebidas do Supabase na tabela local."""
+    if tabela == "coletores":
+        valores = [(r["id_coletor"], r.get("nome_completo"), json.dumps(r)) for r in linhas]
+        conexao.executemany("insert or replace into coletores values (?, ?, ?)", valores)
+    elif tabela == "materiais":
+        valores = [(r["id_material"], r.get("nome_material"), json.dumps(r)) for r in linhas]
+        conexao.executemany("insert or replace into materiais values (?, ?, ?)", valores)
+    elif tabela == "pesagens":
+        valores = [(
+            r["id_pesagem"], r["id_coletor"], r["id_material"], r["peso"],
+            r["data_pesagem"], r["numero_protocolo"], int(bool(r.get("sorteado")))
+        ) for r in linhas]
+        conexao.executemany("insert or replace into pesagens values (?, ?, ?, ?, ?, ?, ?)", valores)
+    elif tabela == "sorteios":
+        valores = [(
+            r["numero_sorteio"], r.get("id_pesagem"), r.get("numero_protocolo"),
+            r.get("data_sorteio"), json.dumps(r)
+        ) for r in linhas]
+        conexao.executemany("insert or replace into sorteios values (?, ?, ?, ?, ?)", valores)
+    else:
+        # Exclusões: apaga da réplica as linhas excluídas no Supabase
+        for linha in linhas:
+            if linha["tabela"] in TABELAS and linha["tabela"] != "exclusoes":
+                chave = TABELAS[linha["tabela"]][0]
+                conexao.execute(f"delete from {linha['tabela']} where {chave} = ?", (int(linha["chave"]),))
+
+
+class Replica:
+    """Banco SQLite local e a thread que o mantém sincronizado com o Supabase."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("pragma journal_mode=wal")
+        self._conexao.executescript(ESQUEMA)
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self.ultimo_erro = None
+
+    # ------------------------------
+    # Sincronização
+    # ------------------------------
+    def sincronizar_tabela(self, client, tabela, completa=False):
+        """Copia as linhas novas ou alteradas de `tabela`; devolve quantas foram gravadas.
+
+        Na sincronização completa a tabela inteira é relida e as linhas que não
+        existem mais no Supabase são apagadas no fim (se a leitura falhar no
+        meio, a réplica continua com os dados anteriores).
+        """
+        chave, coluna_cursor, campos = TABELAS[tabela]
+        estado = None
+        if not completa:
+            with self._lock:
+                estado = self._conexao.execute(
+                    "select cursor, chave from sincronizacao where tabela = ?", (tabela,)
+                ).fetchone()
+        novo_cursor, nova_chave = estado if estado else (None, None)
+
+        cursor, ultima_chave = novo_cursor, nova_chave
+        if cursor is not None and coluna_cursor != chave:
+            cursor = (datetime.datetime.fromisoformat(cursor) - MARGEM_SINCRONIZACAO).isoformat()
+            ultima_chave = None
+
+        vistas = []
+        while True:
+            query = client.table(tabela).select(campos)
+            if cursor is not None and coluna_cursor == chave:
+                query = query.gt(chave, cursor)
+            elif cursor is not None and ultima_chave is None:
+                query = query.gte(coluna_cursor, cursor)
+            elif cursor is not None:
+                query = query.or_(
+                    f'{coluna_cursor}.gt."{cursor}",'
+                    f'and({coluna_cursor}.eq."{cursor}",{chave}.gt.{ultima_chave})'
+                )
+            if coluna_cursor != chave:
+                query = query.order(coluna_cursor)
+            lote = query.order(chave).limit(LOTE_SINCRONIZACAO).execute().data
+            if not lote:
+                break
+
+            cursor, ultima_chave = lote[-1][coluna_cursor], lote[-1][chave]
+            if coluna_cursor == chave or novo_cursor is None or str(cursor) > str(novo_cursor):
+                novo_cursor, nova_chave = cursor, ultima_chave
+            with self._lock:
+                _gravar_linhas(self._conexao, tabela, lote)
+                self._conexao.commit()
+            vistas.extend(r[chave] for r in lote)
+            if len(lote) < LOTE_SINCRONIZACAO:
+                break
+
+        with self._lock:
+            if completa and tabela != "exclusoes":
+                self._conexao.execute("create temp table if not exists vistas (id integer primary key)")
+                self._conexao.execute("delete from vistas")
+                self._conexao.executemany("insert or ignore into vistas values (?)", ((i,) for i in vistas))
+                self._conexao.execute(f"delete from {tabela} where {chave} not in (select id from vistas)")
+            self._conexao.execute(
+                "insert or replace into sincronizacao values (?, ?, ?, ?)",
+                (tabela, None if novo_cursor is None else str(novo_cursor), nova_chave,
+                 datetime.datetime.now().isoformat())
+            )
+            self._conexao.commit()
+        return len(vistas)
+
+    def sincronizar(self, client, completa=False):
+        """Sincroniza todas as tabelas; devolve {tabela: linhas gravadas}."""
+        return {tabela: self.sincronizar_tabela(client, tabela, completa) for tabela in TABELAS}
+
+    def iniciar(self, client, intervalo=30):
+        """Sincroniza em segundo plano a cada `intervalo` segundos (ou quando acordada)."""
+        if self._thread is not None:
+            return
+
+        def laco():
+            while True:
+                try:
+                    self.sincronizar(client)
+                    self.ultimo_erro = None
+                except Exception as e:  # sem rede, a réplica continua servindo as leituras
+                    self.ultimo_erro = str(e)
+                self._acordar.wait(intervalo)
+                self._acordar.clear()
+
+        self._thread = threading.Thread(target=laco, name="replica-sincronizacao", daemon=True)
+        self._thread.start()
+
+    def gravar(self, tabela, linhas):
+        """Grava na réplica linhas que esta estação acabou de gravar no Supabase.
+
+        Assim a própria estação vê a gravação sem esperar a próxima
+        sincronização (que depois traz as mesmas linhas de novo).
+        """
+        with self._lock:
+            _gravar_linhas(self._conexao, tabela, linhas)
+            self._conexao.commit()
+
+    def atualizar_colunas(self, tabela, linhas):
+        """Como `gravar`, para linhas parciais: só as colunas presentes são alteradas."""
+        chave = TABELAS[tabela][0]
+        with self._lock:
+            colunas = {c[1] for c in self._conexao.execute(f"pragma table_info({tabela})")}
+            for linha in linhas:
+                valores = {c: v for c, v in linha.items() if c in colunas and c != chave}
+                if valores:
+                    atribuicoes = ", ".join(f"{c} = ?" for c in valores)
+                    self._conexao.execute(
+                        f"update {tabela} set {atribuicoes} where {chave} = ?",
+                        [*valores.values(), linha[chave]]
+                    )
+            self._conexao.commit()
+
+    def agendar(self):
+        """Antecipa a próxima sincronização em segundo plano."""
+        self._acordar.set()
+
+    def pronta(self):
+        """Verdadeiro depois que todas as tabelas foram copiadas ao menos uma vez."""
+        return self._consultar("select count(*) from sincronizacao").iloc[0, 0] == len(TABELAS)
+
+    def sincronizado_em(self):
+        """Momento da sincronização mais antiga entre as tabelas (None se nunca sincronizou)."""
+        valor = self._consultar("select min(sincronizado_em) from sincronizacao").iloc[0, 0]
+        return datetime.datetime.fromisoformat(valor) if valor else None
+
+    # ------------------------------
+    # Consultas locais
+    # ------------------------------
+    def _consultar(self, sql, parametros=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._conexao, params=parametros)
+
+    def referencia(self, tabela):
+        """Linhas completas de coletores ou materiais, como o select("*") do Supabase."""
+        dados = self._consultar(f"select dados from {tabela} order by 1")["dados"]
+        return pd.DataFrame([json.loads(d) for d in dados])
+
+    @staticmethod
+    def _filtros(id_coletor=None, data=None):
+        condicoes, parametros = ["1 = 1"], []
+        if id_coletor is not None:
+            condicoes.append("p.id_coletor = ?")
+            parametros.append(int(id_coletor))
+        if data:
+            condicoes.append("p.data_pesagem = ?")
+            parametros.append(str(data))
+        return " and ".join(condicoes), parametros
+
+    def contar_pesagens(self, id_coletor=None, data=None):
+        where, parametros = self._filtros(id_coletor, data)
+        return int(self._consultar(f"select count(*) from pesagens p where {where}", parametros).iloc[0, 0])
+
+    def pagina_pesagens(self, inicio, fim, id_coletor=None, data=None):
+        """Linhas [inicio, fim) da listagem, com as mesmas colunas da consulta ao Supabase."""
+        where, parametros = self._filtros(id_coletor, data)
+        return self._consultar(
+            f"""
+            select p.id_pesagem as "ID", p.numero_protocolo as "Protocolo",
+                   c.nome_completo as "Coletor", m.nome_material as "Material",
+                   p.peso as "Peso (kg)", p.data_pesagem as "Data"
+            from pesagens p
+            left join coletores c on c.id_coletor = p.id_coletor
+            left join materiais m on m.id_material = p.id_material
+            where {where}
+            order by p.data_pesagem desc, p.id_pesagem desc
+            limit ? offset ?
+            """,
+            parametros + [fim - inicio, inicio]
+        )
+
+    def totais(self, data_inicial, data_final, por="coletor"):
+        """Peso total por coletor (ou por material) no intervalo, do maior para o menor."""
+        tabela, chave, nome = {
+            "coletor": ("coletores", "id_coletor", "nome_completo"),
+            "material": ("materiais", "id_material", "nome_material")
+        }[por]
+        return self._consultar(
+            f"""
+            select coalesce(t.{nome}, '{por.capitalize()} ' || p.{chave}) as {por}, sum(p.peso) as total_kg
+            from pesagens p
+            left join {tabela} t on t.{chave} = p.{chave}
+            where p.data_pesagem between ? and ?
+            group by p.{chave}
+            order by total_kg desc
+            """,
+            (str(data_inicial), str(data_final))
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sincroniza a réplica local com o Supabase.")
+    parser.add_argument("caminho", help="arquivo SQLite da réplica")
+    parser.add_argument("--completa", action="store_true", help="recopia tudo (inclui exclusões)")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    gravadas = Replica(args.caminho).sincronizar(obter_cliente(), completa=args.completa)
+    resumo = ", ".join(f"{tabela}: {n}" for tabela, n in gravadas.items())
+    print(f"✅ Réplica sincronizada em {time.perf_counter() - inicio:.1f}s ({resumo}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
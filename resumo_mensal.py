@@ -0,0 +1,28 @@
+# resumo_mensal.py
+"""Recalcula do zero o resumo mensal das pesagens (sql/resumo_mensal.sql).
+
+O gatilho em pesagens mantém o resumo a cada gravação; o recálculo só é
+necessário depois de cargas feitas com o gatilho desligado ou para conferir:
+
+    python resumo_mensal.py
+"""
+import sys
+import time
+
+from conexao import obter_cliente
+
+
+def reconstruir(client):
+    """Chama a RPC reconstruir_resumo_mensal e devolve o número de linhas do resumo."""
+    return client.rpc("reconstruir_resumo_mensal", {}).execute().data
+
+
+def main():
+    inicio = time.perf_counter()
+    linhas = reconstruir(obter_cliente())
+    print(f"✅ Resumo mensal recalculado: {linhas} linhas em {time.perf_counter() - inicio:.1f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,14 @@
 # admin_usuarios_supabase.py
 import streamlit as st
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import os
+from supabase import Client
+from conexao import obter_cliente
 import bcrypt
 
 # ======================================
 # Conexão com Supabase
 # ======================================
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Cliente único do processo: as conexões HTTP sobrevivem aos reruns
+supabase: Client = obter_cliente()
 
 
 # ======================================
@@ -0,0 +1,191 @@
+# sorteio.py
+"""Algoritmos de sorteio de protocolos e verificação de sorteios auditáveis.
+
+Não depende do Streamlit nem do Supabase: recebe os ids elegíveis (e os pesos,
+no sorteio ponderado) e devolve os ids sorteados, na ordem do sorteio.
+
+Verificação de um sorteio a partir do retrato das pesagens elegíveis:
+
+    python sorteio.py elegiveis_sorteio.csv --semente <semente> --quantidade 5 \\
+        --algoritmo ponderado-v1 --hash <hash_elegiveis>
+"""
+import argparse
+import hashlib
+import random
+import secrets
+import sys
+from array import array
+
+
+# ======================================
+# Sorteio simples (um bilhete por protocolo)
+# ======================================
+def sortear_uniforme(ids, qtd, rng=None):
+    """Sorteia `qtd` ids distintos, todos com a mesma chance.
+
+    Fisher-Yates parcial com trocas guardadas num dicionário: O(qtd) de memória.
+    O índice de cada sorteado vem de rng.random(), como no sorteio ponderado:
+    é o único método do random.Random com a mesma sequência garantida entre
+    versões do Python para uma mesma semente (randrange não tem essa garantia).
+    """
+    rng = rng or random.Random()
+    trocas = {}
+    sorteados = []
+    for i in range(min(qtd, len(ids))):
+        restantes = len(ids) - i
+        j = i + min(int(rng.random() * restantes), restantes - 1)
+        sorteados.append(ids[trocas.get(j, j)])
+        trocas[j] = trocas.get(i, i)
+    return sorteados
+
+
+# ======================================
+# Sorteio ponderado (bilhetes proporcionais ao peso)
+# ======================================
+class _SomasAcumuladas:
+    """Árvore de Fenwick sobre os pesos: soma acumulada, busca binária e remoção em O(log n)."""
+
+    def __init__(self, pesos):
+        self.n = len(pesos)
+        self.arvore = array("d", [0.0]) + array("d", pesos)
+        for i in range(1, self.n + 1):
+            pai = i + (i & -i)
+            if pai <= self.n:
+                self.arvore[pai] += self.arvore[i]
+        self.passo_inicial = 1 << (self.n.bit_length() - 1) if self.n else 0
+
+    def remover(self, posicao, peso):
+        i = posicao + 1
+        while i <= self.n:
+            self.arvore[i] -= peso
+            i += i & -i
+
+    def buscar(self, alvo):
+        """Menor posição cuja soma acumulada (inclusive) ultrapassa `alvo`."""
+        i = 0
+        passo = self.passo_inicial
+        while passo:
+            proximo = i + passo
+            if proximo <= self.n and self.arvore[proximo] <= alvo:
+                i = proximo
+                alvo -= self.arvore[proximo]
+            passo >>= 1
+        return min(i, self.n - 1)
+
+
+def sortear_ponderado(ids, pesos, qtd, rng=None):
+    """Sorteia `qtd` ids distintos com chance proporcional ao peso de cada um.
+
+    Cada sorteado sai da árvore antes do próximo sorteio (sem reposição), então
+    o custo é O(n) para montar a estrutura e O(log n) por sorteado, sem
+    expandir os pesos em bilhetes. Pesos nulos ou negativos nunca são sorteados.
+    """
+    rng = rng or random.Random()
+    pesos = array("d", (p if p > 0 else 0.0 for p in pesos))
+    somas = _SomasAcumuladas(pesos)
+    restante = sum(pesos)
+    disponiveis = sum(1 for p in pesos if p > 0)
+
+    sorteados = []
+    for _ in range(min(qtd, disponiveis)):
+        posicao = somas.buscar(rng.random() * restante)
+        # Arredondamentos podem cair numa posição já removida: procura a próxima com peso
+        while pesos[posicao] == 0.0:
+            posicao = somas.buscar(rng.random() * restante)
+        sorteados.append(ids[posicao])
+        somas.remover(posicao, pesos[posicao])
+        restante -= pesos[posicao]
+        pesos[posicao] = 0.0
+    return sorteados
+
+
+# ======================================
+# Sorteio auditável (semente + retrato dos elegíveis)
+# ======================================
+ALGORITMOS = {
+    "uniforme-v1": lambda ids, pesos, qtd, rng: sortear_uniforme(ids, qtd, rng),
+    "ponderado-v1": sortear_ponderado,
+}
+
+
+def gerar_semente():
+    return secrets.token_hex(16)
+
+
+def compromisso_semente(semente):
+    """Hash divulgado antes do sorteio; revelar a semente depois prova que ela não mudou."""
+    return hashlib.sha256(semente.encode("utf-8")).hexdigest()
+
+
+def linha_retrato(id_pesagem, peso):
+    """Linha canônica do retrato: a mesma usada no hash e no arquivo CSV."""
+    return f"{int(id_pesagem)},{float(peso)!r}\n"
+
+
+def hash_elegiveis(ids, pesos):
+    """SHA-256 do conjunto elegível, calculado em streaming na ordem de id_pesagem."""
+    h = hashlib.sha256()
+    for id_pesagem, peso in zip(ids, pesos):
+        h.update(linha_retrato(id_pesagem, peso).encode("ascii"))
+    return h.hexdigest()
+
+
+def sortear_com_semente(ids, pesos, qtd, semente, algoritmo):
+    """Executa o sorteio de forma reproduzível: mesma entrada e semente, mesmos sorteados."""
+    return ALGORITMOS[algoritmo](ids, pesos, qtd, random.Random(semente))
+
+
+def gerar_retrato(ids, pesos):
+    """Conteúdo CSV (id_pesagem,peso) dos elegíveis, para guardar junto ao sorteio."""
+    yield "id_pesagem,peso\n"
+    for id_pesagem, peso in zip(ids, pesos):
+        yield linha_retrato(id_pesagem, peso)
+
+
+def ler_retrato(caminho):
+    """Lê o CSV do retrato em arrays compactos, calculando o hash durante a leitura."""
+    ids, pesos = array("q"), array("d")
+    h = hashlib.sha256()
+    with open(caminho, encoding="ascii") as arquivo:
+        next(arquivo, None)  # cabeçalho
+        for linha in arquivo:
+            if not linha.strip():
+                continue
+            id_pesagem, peso = linha.strip().split(",")
+            ids.append(int(id_pesagem))
+            pesos.append(float(peso))
+            h.update(linha_retrato(ids[-1], pesos[-1]).encode("ascii"))
+    return ids, pesos, h.hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recalcula um sorteio a partir do retrato dos elegíveis.")
+    parser.add_argument("retrato", help="CSV id_pesagem,peso baixado no momento do sorteio")
+    parser.add_argument("--semente", required=True)
+    parser.add_argument("--quantidade", type=int, required=True)
+    parser.add_argument("--algoritmo", choices=sorted(ALGORITMOS), required=True)
+    parser.add_argument("--hash", help="hash_elegiveis registrado em sorteios")
+    parser.add_argument("--sorteados", help="ids sorteados registrados, separados por vírgula")
+    args = parser.parse_args(argv)
+
+    ids, pesos, hash_calculado = ler_retrato(args.retrato)
+    sorteados = sortear_com_semente(ids, pesos, args.quantidade, args.semente, args.algoritmo)
+
+    print(f"Elegíveis: {len(ids)}")
+    print(f"Hash dos elegíveis: {hash_calculado}")
+    print(f"Sorteados: {','.join(str(i) for i in sorteados)}")
+
+    ok = True
+    if args.hash and args.hash != hash_calculado:
+        print("❌ O hash do retrato não confere com o registrado.")
+        ok = False
+    if args.sorteados and [int(i) for i in args.sorteados.split(",")] != sorteados:
+        print("❌ Os sorteados recalculados não conferem com os registrados.")
+        ok = False
+    if ok:
+        print("✅ Sorteio verificado.")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+-- Gravação das edições do st.data_editor com verificação de conflito atômica
+-- (alteracoes.py). Cada alteração traz o id, os valores que estavam na tela
+-- ("antes") e os editados ("depois"); a linha só é atualizada se o banco ainda
+-- tem os valores de "antes", e só as colunas editadas são gravadas.
+--
+-- p_alteracoes: [{"id": 5, "antes": {"peso": 1.2}, "depois": {"peso": 1.5}}, ...]
+-- Devolve os ids atualizados; os demais são conflitos (alterados ou excluídos).
+
+create or replace function salvar_alteracoes(p_tabela text, p_chave text, p_alteracoes jsonb)
+returns jsonb
+language plpgsql
+volatile
+as $$
+declare
+    v_colunas text[];
+    v_set text;
+    v_condicao text;
+    v_ids jsonb;
+begin
+    if p_tabela not in ('coletores', 'materiais', 'pesagens') then
+        raise exception 'Tabela não permitida: %', p_tabela;
+    end if;
+    if jsonb_array_length(p_alteracoes) = 0 then
+        return '[]'::jsonb;
+    end if;
+
+    select array_agg(k) into v_colunas
+    from jsonb_object_keys(p_alteracoes -> 0 -> 'depois') k;
+
+    select string_agg(format('%1$I = (x.depois).%1$I', c), ', '),
+           string_agg(format('t.%1$I is not distinct from (x.antes).%1$I', c), ' and ')
+    into v_set, v_condicao
+    from unnest(v_colunas) c;
+
+    -- jsonb_populate_record converte cada valor para o tipo da coluna
+    execute format(
+        'with atualizadas as (
+            update %1$I t set %2$s
+            from (
+                select (jsonb_populate_record(null::%1$I, jsonb_build_object(%4$L, e -> ''id''))).%3$I as id,
+                       jsonb_populate_record(null::%1$I, e -> ''antes'') as antes,
+                       jsonb_populate_record(null::%1$I, e -> ''depois'') as depois
+                from jsonb_array_elements($1) e
+            ) x
+            where t.%3$I = x.id and %5$s
+            returning t.%3$I
+        )
+        select coalesce(jsonb_agg(%3$I), ''[]''::jsonb) from atualizadas',
+        p_tabela, v_set, p_chave, p_chave, v_condicao
+    ) into v_ids using p_alteracoes;
+
+    return v_ids;
+end;
+$$;
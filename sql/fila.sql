@@ -0,0 +1,7 @@
+-- Chave de idempotência das pesagens gravadas pela fila local (fila.py):
+-- reenviar uma pesagem que já chegou ao banco não cria uma segunda linha.
+
+alter table pesagens add column if not exists chave_idempotencia uuid;
+
+create unique index if not exists pesagens_chave_idempotencia_key
+    on pesagens (chave_idempotencia);
@@ -0,0 +1,36 @@
+-- Indicadores da página "Painel": peso por dia e material, coletores ativos e
+-- participação no sorteio por mês. Devolve um único jsonb (sem o limite de
+-- linhas do PostgREST); o app guarda cada mês fechado em cache e só volta a
+-- pedir o mês corrente.
+
+create or replace function painel_pesagens(data_inicial date, data_final date)
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'diario', coalesce((
+            select jsonb_agg(d)
+            from (
+                select data_pesagem as dia, id_material, sum(peso) as total_kg, count(*) as quantidade,
+                       count(*) filter (where sorteado) as sorteados
+                from pesagens
+                where data_pesagem between data_inicial and data_final
+                group by 1, 2
+            ) d
+        ), '[]'::jsonb),
+        'mensal', coalesce((
+            select jsonb_agg(m)
+            from (
+                select date_trunc('month', data_pesagem)::date as mes,
+                       count(distinct id_coletor) as coletores_ativos,
+                       count(*) as protocolos,
+                       count(*) filter (where sorteado) as sorteados,
+                       count(distinct id_coletor) filter (where sorteado) as coletores_sorteados
+                from pesagens
+                where data_pesagem between data_inicial and data_final
+                group by 1
+            ) m
+        ), '[]'::jsonb)
+    );
+$$;
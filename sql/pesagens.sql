@@ -0,0 +1,12 @@
+-- Uma pesagem por coletor, material e dia, garantida pelo banco.
+-- O app tenta gravar direto e trata a violação (23505) como duplicidade,
+-- sem consulta prévia e sem corrida entre estações.
+--
+-- Se já houver repetições, o índice não é criado. Para encontrá-las:
+--   select id_coletor, id_material, data_pesagem, count(*)
+--   from pesagens
+--   group by 1, 2, 3
+--   having count(*) > 1;
+
+create unique index if not exists pesagens_coletor_material_data_key
+    on pesagens (id_coletor, id_material, data_pesagem);
@@ -0,0 +1,47 @@
+-- Numeração de protocolos AAMMXXXX sem corrida entre estações.
+-- Cada mês tem um contador; a reserva é um único update atômico.
+
+create table if not exists protocolo_sequencia (
+    ano_mes text primary key,
+    ultimo  integer not null
+);
+
+create unique index if not exists pesagens_numero_protocolo_key
+    on pesagens (numero_protocolo);
+
+-- Reserva p_quantidade números consecutivos do mês e devolve o último deles.
+-- Normalmente é só o update do contador; na primeira reserva do mês o contador
+-- é criado a partir do maior protocolo já gravado (o max() roda só nessa vez).
+create or replace function reservar_protocolos(p_ano_mes text, p_quantidade integer default 1)
+returns integer
+language plpgsql
+volatile
+as $$
+declare
+    v_ultimo integer;
+begin
+    update protocolo_sequencia
+        set ultimo = ultimo + p_quantidade
+        where ano_mes = p_ano_mes
+        returning ultimo into v_ultimo;
+    if found then
+        return v_ultimo;
+    end if;
+
+    -- Outra estação pode criar o contador ao mesmo tempo: o on conflict soma
+    -- sobre o valor dela em vez de falhar
+    insert into protocolo_sequencia as s (ano_mes, ultimo)
+    values (
+        p_ano_mes,
+        coalesce((
+            select max(substr(numero_protocolo, 5)::integer)
+            from pesagens
+            where numero_protocolo like p_ano_mes || '%'
+        ), 0) + p_quantidade
+    )
+    on conflict (ano_mes) do update
+        set ultimo = s.ultimo + p_quantidade
+    returning ultimo into v_ultimo;
+    return v_ultimo;
+end;
+$$;
@@ -0,0 +1,18 @@
+-- Ranking de coletores: soma do peso por coletor num intervalo de datas.
+-- Usado pela página "Ranking" (app.py e app_sem_sorteio.py) via supabase.rpc.
+-- Lê o resumo mensal (sql/resumo_mensal.sql, que deve ser executado antes).
+
+create index if not exists pesagens_data_pesagem_idx
+    on pesagens (data_pesagem);
+
+create or replace function ranking_coletores(data_inicial date, data_final date)
+returns table (id_coletor bigint, coletor text, total_kg numeric)
+language sql
+stable
+as $$
+    select c.id_coletor::bigint, c.nome_completo::text, sum(r.total_kg)::numeric
+    from resumo_periodo(data_inicial, data_final) r
+    join coletores c on c.id_coletor = r.id_coletor
+    group by c.id_coletor, c.nome_completo
+    order by 3 desc;
+$$;
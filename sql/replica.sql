@@ -0,0 +1,73 @@
+-- Coluna atualizado_em e registro de exclusões para a réplica local das
+-- estações (replica.py): cada sincronização busca só o que mudou depois da anterior.
+
+create or replace function marcar_atualizacao()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.atualizado_em := now();
+    return new;
+end;
+$$;
+
+alter table coletores add column if not exists atualizado_em timestamptz not null default now();
+alter table materiais add column if not exists atualizado_em timestamptz not null default now();
+alter table pesagens  add column if not exists atualizado_em timestamptz not null default now();
+
+create index if not exists coletores_atualizado_em_idx on coletores (atualizado_em, id_coletor);
+create index if not exists materiais_atualizado_em_idx on materiais (atualizado_em, id_material);
+create index if not exists pesagens_atualizado_em_idx  on pesagens  (atualizado_em, id_pesagem);
+
+drop trigger if exists coletores_atualizado_em_trg on coletores;
+create trigger coletores_atualizado_em_trg
+    before update on coletores
+    for each row execute function marcar_atualizacao();
+
+drop trigger if exists materiais_atualizado_em_trg on materiais;
+create trigger materiais_atualizado_em_trg
+    before update on materiais
+    for each row execute function marcar_atualizacao();
+
+drop trigger if exists pesagens_atualizado_em_trg on pesagens;
+create trigger pesagens_atualizado_em_trg
+    before update on pesagens
+    for each row execute function marcar_atualizacao();
+
+-- Exclusões: a réplica não tem como notar uma linha que sumiu, então cada
+-- exclusão deixa um registro aqui, copiado pela réplica como as outras tabelas.
+create table if not exists exclusoes (
+    id_exclusao bigserial primary key,
+    tabela      text not null,
+    chave       bigint not null,
+    excluida_em timestamptz not null default now()
+);
+
+create index if not exists exclusoes_excluida_em_idx on exclusoes (excluida_em, id_exclusao);
+
+-- TG_ARGV[0]: coluna da chave primária da tabela
+create or replace function registrar_exclusao()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into exclusoes (tabela, chave)
+    values (TG_TABLE_NAME, (to_jsonb(old) ->> TG_ARGV[0])::bigint);
+    return old;
+end;
+$$;
+
+drop trigger if exists coletores_exclusao_trg on coletores;
+create trigger coletores_exclusao_trg
+    after delete on coletores
+    for each row execute function registrar_exclusao('id_coletor');
+
+drop trigger if exists materiais_exclusao_trg on materiais;
+create trigger materiais_exclusao_trg
+    after delete on materiais
+    for each row execute function registrar_exclusao('id_material');
+
+drop trigger if exists pesagens_exclusao_trg on pesagens;
+create trigger pesagens_exclusao_trg
+    after delete on pesagens
+    for each row execute function registrar_exclusao('id_pesagem');
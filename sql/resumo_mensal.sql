@@ -0,0 +1,121 @@
+-- Resumo mensal das pesagens por coletor e material (soma do peso e quantidade).
+-- Mantido a cada gravação por gatilho: inserção, edição de peso/data e exclusão
+-- aplicam só a diferença na linha do mês. Ranking e painéis leem o resumo para
+-- os meses inteiros do intervalo e as pesagens brutas só nos meses das pontas.
+--
+-- Para recalcular do zero: select reconstruir_resumo_mensal();
+-- (ou python resumo_mensal.py). Execute antes de sql/ranking_coletores.sql.
+
+create table if not exists pesagens_resumo_mensal (
+    mes         date    not null,  -- primeiro dia do mês
+    id_coletor  bigint  not null,
+    id_material bigint  not null,
+    total_kg    numeric not null default 0,
+    quantidade  integer not null default 0,
+    primary key (mes, id_coletor, id_material)
+);
+
+create or replace function aplicar_resumo_mensal(
+    p_data date, p_id_coletor bigint, p_id_material bigint, p_peso numeric, p_quantidade integer
+)
+returns void
+language sql
+volatile
+as $$
+    insert into pesagens_resumo_mensal as r (mes, id_coletor, id_material, total_kg, quantidade)
+    values (date_trunc('month', p_data)::date, p_id_coletor, p_id_material, coalesce(p_peso, 0), p_quantidade)
+    on conflict (mes, id_coletor, id_material) do update
+        set total_kg = r.total_kg + excluded.total_kg,
+            quantidade = r.quantidade + excluded.quantidade;
+$$;
+
+create or replace function pesagens_atualizar_resumo()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform aplicar_resumo_mensal(old.data_pesagem, old.id_coletor, old.id_material, -old.peso, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform aplicar_resumo_mensal(new.data_pesagem, new.id_coletor, new.id_material, new.peso, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists pesagens_resumo_mensal_trg on pesagens;
+create trigger pesagens_resumo_mensal_trg
+    after insert or delete or update of peso, data_pesagem, id_coletor, id_material on pesagens
+    for each row execute function pesagens_atualizar_resumo();
+
+-- Recalcula o resumo inteiro a partir de pesagens; devolve o número de linhas.
+-- Bloqueia gravações em pesagens durante o recálculo para não perder diferenças.
+create or replace function reconstruir_resumo_mensal()
+returns bigint
+language plpgsql
+volatile
+as $$
+declare
+    linhas bigint;
+begin
+    lock table pesagens in share mode;
+    delete from pesagens_resumo_mensal;
+    insert into pesagens_resumo_mensal (mes, id_coletor, id_material, total_kg, quantidade)
+    select date_trunc('month', data_pesagem)::date, id_coletor, id_material, coalesce(sum(peso), 0), count(*)
+    from pesagens
+    group by 1, 2, 3;
+    get diagnostics linhas = row_count;
+    return linhas;
+end;
+$$;
+
+-- Totais por coletor e material num intervalo de datas: meses inteiros vêm do
+-- resumo, os dias soltos nas pontas vêm direto de pesagens.
+create or replace function resumo_periodo(data_inicial date, data_final date)
+returns table (id_coletor bigint, id_material bigint, total_kg numeric, quantidade bigint)
+language sql
+stable
+as $$
+    with meses as (
+        select (date_trunc('month', data_inicial - 1) + interval '1 month')::date as inicio,
+               date_trunc('month', data_final + 1)::date as fim
+    ),
+    partes as (
+        select r.id_coletor, r.id_material, r.total_kg, r.quantidade::bigint as quantidade
+        from pesagens_resumo_mensal r, meses m
+        where r.mes >= m.inicio and r.mes < m.fim
+        union all
+        select p.id_coletor, p.id_material, p.peso, 1
+        from pesagens p, meses m
+        where p.data_pesagem between data_inicial and data_final
+          and (p.data_pesagem < m.inicio or p.data_pesagem >= m.fim)
+    )
+    select id_coletor::bigint, id_material::bigint, sum(total_kg)::numeric, sum(quantidade)::bigint
+    from partes
+    group by 1, 2
+    having sum(quantidade) > 0;
+$$;
+
+-- Peso total e quantidade de pesagens por material no intervalo.
+create or replace function totais_por_material(data_inicial date, data_final date)
+returns table (id_material bigint, material text, total_kg numeric, quantidade bigint)
+language sql
+stable
+as $$
+    select m.id_material::bigint, m.nome_material::text, sum(r.total_kg)::numeric, sum(r.quantidade)::bigint
+    from resumo_periodo(data_inicial, data_final) r
+    join materiais m on m.id_material = r.id_material
+    group by m.id_material, m.nome_material
+    order by 3 desc;
+$$;
+
+-- Carga inicial só na primeira execução (resumo ainda vazio); depois o gatilho
+-- mantém o resumo e reexecutar este script não relê as pesagens
+do $$
+begin
+    if not exists (select 1 from pesagens_resumo_mensal) and exists (select 1 from pesagens) then
+        perform reconstruir_resumo_mensal();
+    end if;
+end;
+$$;
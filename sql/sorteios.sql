@@ -0,0 +1,96 @@
+-- Sorteio de protocolos em uma única transação no servidor.
+
+create index if not exists pesagens_nao_sorteadas_idx
+    on pesagens (id_pesagem) where not sorteado;
+
+-- Dados de auditoria dos sorteios feitos com semente (ver sorteio.py)
+alter table sorteios add column if not exists semente text;
+alter table sorteios add column if not exists hash_elegiveis text;
+alter table sorteios add column if not exists versao_algoritmo text;
+-- Caminho do retrato dos elegíveis no Storage (bucket/arquivo)
+alter table sorteios add column if not exists retrato_elegiveis text;
+
+-- Bucket privado onde o app guarda o retrato de cada sorteio com semente,
+-- nomeado pelo hash dos elegíveis
+insert into storage.buckets (id, name, public)
+values ('retratos-sorteio', 'retratos-sorteio', false)
+on conflict (id) do nothing;
+
+drop function if exists registrar_sorteio(bigint[]);
+drop function if exists registrar_sorteio(bigint[], text, text, text);
+
+-- Registra como sorteadas as pesagens de p_ids (na ordem recebida), numerando
+-- os sorteios em sequência. Pesagens já sorteadas são ignoradas.
+create or replace function registrar_sorteio(
+    p_ids bigint[],
+    p_semente text default null,
+    p_hash_elegiveis text default null,
+    p_versao_algoritmo text default null,
+    p_retrato_elegiveis text default null
+)
+returns table (
+    numero_sorteio integer,
+    id_pesagem bigint,
+    numero_protocolo text,
+    nome_completo text,
+    telefone_celular text
+)
+language plpgsql
+volatile
+as $$
+#variable_conflict use_column
+declare
+    v_ultimo integer;
+begin
+    -- Serializa sorteios concorrentes: a numeração não tem lacunas nem repetições
+    lock table sorteios in share row exclusive mode;
+    select coalesce(max(s.numero_sorteio), 0) into v_ultimo from sorteios s;
+
+    return query
+    with escolhidas as (
+        select p.id_pesagem, p.numero_protocolo, p.id_coletor,
+               (v_ultimo + row_number() over (order by u.ordem))::integer as numero
+        from unnest(p_ids) with ordinality as u(id, ordem)
+        join pesagens p on p.id_pesagem = u.id
+        where not p.sorteado
+    ), inseridos as (
+        insert into sorteios (id_pesagem, numero_protocolo, numero_sorteio,
+                              semente, hash_elegiveis, versao_algoritmo, retrato_elegiveis)
+        select e.id_pesagem, e.numero_protocolo, e.numero,
+               p_semente, p_hash_elegiveis, p_versao_algoritmo, p_retrato_elegiveis
+        from escolhidas e
+        returning sorteios.id_pesagem
+    ), marcados as (
+        update pesagens p set sorteado = true
+        from escolhidas e
+        where p.id_pesagem = e.id_pesagem
+        returning p.id_pesagem
+    )
+    select e.numero, e.id_pesagem::bigint, e.numero_protocolo::text,
+           c.nome_completo::text, c.telefone_celular::text
+    from escolhidas e
+    join coletores c on c.id_coletor = e.id_coletor
+    order by e.numero;
+end;
+$$;
+
+-- Sorteia p_quantidade pesagens ainda não sorteadas e as registra.
+create or replace function realizar_sorteio(p_quantidade integer)
+returns table (
+    numero_sorteio integer,
+    id_pesagem bigint,
+    numero_protocolo text,
+    nome_completo text,
+    telefone_celular text
+)
+language sql
+volatile
+as $$
+    select * from registrar_sorteio(array(
+        select p.id_pesagem::bigint
+        from pesagens p
+        where not p.sorteado
+        order by random()
+        limit p_quantidade
+    ));
+$$;
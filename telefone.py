@@ -0,0 +1,65 @@
+# telefone.py
+"""Telefones celulares: normalização, validação e formatação de colunas inteiras.
+
+Todas as funções recebem e devolvem pandas.Series. Telefones são gravados só
+com dígitos (DDD + número, 11 dígitos) e formatados apenas para exibição.
+"""
+import re
+
+import numpy as np
+
+DIGITOS_CELULAR = 11
+
+
+def normalizar_telefone(valor):
+    """Só os dígitos de um telefone digitado num formulário."""
+    return re.sub(r"\D", "", "" if valor is None else str(valor))
+
+
+def normalizar_telefones(serie):
+    """Só os dígitos de cada telefone; nulos viram texto vazio.
+
+    O regex só roda nos valores que não são apenas dígitos, que é o caso
+    comum dos telefones já gravados no banco.
+    """
+    texto = serie.fillna("").astype(str)
+    limpos = texto.str.isdigit()
+    if limpos.all():
+        return texto
+    return texto.where(limpos, texto[~limpos].str.replace(r"\D", "", regex=True))
+
+
+def validar_telefones(serie):
+    """True onde o telefone tem exatamente 11 dígitos (DDD + número)."""
+    return normalizar_telefones(serie).str.len() == DIGITOS_CELULAR
+
+
+def _mascarar(digitos, tamanho, meio):
+    """Monta "(DD) XXXX-XXXX" trabalhando sobre a matriz de caracteres do numpy."""
+    caracteres = digitos.to_numpy(dtype=f"U{tamanho}").view("U1").reshape(-1, tamanho)
+    saida = np.empty((len(caracteres), tamanho + 4), dtype="U1")
+    saida[:, 0] = "("
+    saida[:, 1:3] = caracteres[:, :2]
+    saida[:, 3] = ")"
+    saida[:, 4] = " "
+    saida[:, 5:5 + meio] = caracteres[:, 2:2 + meio]
+    saida[:, 5 + meio] = "-"
+    saida[:, 6 + meio:] = caracteres[:, 2 + meio:]
+    return saida.view(f"U{tamanho + 4}").ravel()
+
+
+def formatar_telefones(serie):
+    """(DD) XXXXX-XXXX para 11 dígitos e (DD) XXXX-XXXX para 10.
+
+    Outros valores são exibidos como vieram; nulos viram texto vazio.
+    """
+    texto = serie.fillna("").astype(str)
+    digitos = normalizar_telefones(texto)
+    tamanhos = digitos.str.len()
+
+    formatados = texto.astype(object).copy()
+    for tamanho, meio in ((11, 5), (10, 4)):
+        selecionados = (tamanhos == tamanho).to_numpy()
+        if selecionados.any():
+            formatados[selecionados] = _mascarar(digitos[selecionados], tamanho, meio)
+    return formatados
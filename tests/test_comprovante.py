@@ -0,0 +1,37 @@
+# test_comprovante.py
+"""Impressão ESC/POS direta (comprovante.py) num arquivo no lugar da impressora."""
+from comprovante import imprimir_comprovante
+
+DADOS = {
+    "protocolo": "25030001",
+    "data": "2025-03-10",
+    "coletor": "João Conceição",
+    "material": "Papelão",
+    "peso": 12.5,
+}
+
+
+def test_imprime_bytes_escpos_em_arquivo(tmp_path):
+    destino = tmp_path / "impressora.bin"
+    imprimir_comprovante(DADOS, str(destino))
+    conteudo = destino.read_bytes()
+
+    # Inicializa, escolhe a tabela portuguesa (ESC t 3) e termina com avanço e corte
+    assert conteudo.startswith(b"\x1b@\x1bt\x03")
+    assert conteudo.endswith(b"\x1dVB\x03")
+    # Acentos em cp860, não em UTF-8
+    assert "Coletor: João Conceição".encode("cp860") in conteudo
+    assert "Material: Papelão".encode("cp860") in conteudo
+    assert "ã".encode("utf-8") not in conteudo
+    assert b"Protocolo: 25030001\n" in conteudo
+    assert b"Peso: 12.5 kg\n" in conteudo
+
+
+def test_arquivo_recebe_os_comprovantes_em_sequencia(tmp_path):
+    destino = tmp_path / "impressora.bin"
+    imprimir_comprovante(DADOS, str(destino))
+    imprimir_comprovante({**DADOS, "protocolo": "25030002"}, str(destino))
+    conteudo = destino.read_bytes()
+
+    assert conteudo.count(b"\x1dVB\x03") == 2
+    assert conteudo.index(b"25030001") < conteudo.index(b"25030002")
@@ -0,0 +1,216 @@
+# test_fila.py
+"""Fila local de gravações (fila.py) contra um cliente Supabase falso."""
+import json
+import shutil
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+from fila import ARQUIVO_FILA, FilaGravacoes, PoolProtocolos, erro_de_conexao, erro_definitivo
+
+
+class _Resposta:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Consulta:
+    def __init__(self, banco, acao):
+        self.banco = banco
+        self.acao = acao
+        self.filtros = []
+
+    def eq(self, coluna, valor):
+        self.filtros.append(lambda linha: linha.get(coluna) == valor)
+        return self
+
+    def is_(self, coluna, valor):
+        assert valor == "null"
+        self.filtros.append(lambda linha: linha.get(coluna) is None)
+        return self
+
+    def execute(self):
+        if self.banco.offline:
+            raise httpx.ConnectError("sem rede")
+        return _Resposta(self.acao(lambda linha: all(f(linha) for f in self.filtros)))
+
+
+class BancoFalso:
+    """Tabela pesagens com os índices únicos de sql/pesagens.sql e sql/fila.sql."""
+
+    def __init__(self):
+        self.pesagens = []
+        self.offline = False
+        self.upserts = 0
+
+    def table(self, nome):
+        assert nome == "pesagens"
+        return self
+
+    def upsert(self, linhas, on_conflict, ignore_duplicates):
+        assert on_conflict == "chave_idempotencia" and ignore_duplicates
+        return _Consulta(self, lambda filtro: self._upsert(linhas))
+
+    def update(self, valores):
+        def atualizar(filtro):
+            atualizadas = [linha for linha in self.pesagens if filtro(linha)]
+            for linha in atualizadas:
+                linha.update(valores)
+            return [dict(linha) for linha in atualizadas]
+        return _Consulta(self, atualizar)
+
+    def select(self, colunas):
+        return _Consulta(self, lambda filtro: [dict(linha) for linha in self.pesagens if filtro(linha)])
+
+    def _upsert(self, linhas):
+        self.upserts += 1
+        chaves = {p["chave_idempotencia"] for p in self.pesagens}
+        dias = {(p["id_coletor"], p["id_material"], p["data_pesagem"]) for p in self.pesagens}
+        novas = []
+        for linha in linhas:
+            if linha["chave_idempotencia"] in chaves:
+                continue
+            dia = (linha["id_coletor"], linha["id_material"], linha["data_pesagem"])
+            if dia in dias:  # o lote inteiro é desfeito
+                raise APIError({
+                    "code": "23505",
+                    "message": 'duplicate key value violates unique constraint "pesagens_coletor_material_data_key"'
+                })
+            chaves.add(linha["chave_idempotencia"])
+            dias.add(dia)
+            novas.append(linha)
+        self.pesagens.extend(novas)
+        return novas
+
+
+def _pesagem(id_coletor, id_material=1, data="2025-03-10", peso=1.5):
+    return {
+        "id_coletor": id_coletor, "id_material": id_material, "peso": peso,
+        "data_pesagem": data, "numero_protocolo": f"2503{id_coletor:04d}"
+    }
+
+
+@pytest.fixture
+def banco():
+    return BancoFalso()
+
+
+def test_linha_cortada_no_fim_do_log_e_ignorada(tmp_path):
+    fila = FilaGravacoes(tmp_path)
+    chaves = [fila.enfileirar("inserir_pesagem", _pesagem(i)) for i in (1, 2)]
+    with open(tmp_path / ARQUIVO_FILA, "a", encoding="utf-8") as arquivo:
+        arquivo.write('{"chave": "cortada", "operacao": "inserir_pes')  # queda de energia
+
+    fila = FilaGravacoes(tmp_path)
+    assert list(fila.pendentes) == chaves
+
+    # O log compactado volta a aceitar acréscimos sem herdar a linha cortada
+    fila.enfileirar("inserir_pesagem", _pesagem(3))
+    assert len(FilaGravacoes(tmp_path).pendentes) == 3
+    for linha in (tmp_path / ARQUIVO_FILA).read_text(encoding="utf-8").splitlines():
+        json.loads(linha)
+
+
+def test_reenviar_o_mesmo_log_duas_vezes_nao_duplica(tmp_path, banco):
+    original = tmp_path / "estacao"
+    fila = FilaGravacoes(original)
+    for i in (1, 2, 3):
+        fila.enfileirar("inserir_pesagem", _pesagem(i))
+    copia = tmp_path / "copia"
+    copia.mkdir()
+    shutil.copy(original / ARQUIVO_FILA, copia / ARQUIVO_FILA)
+
+    assert fila.reenviar(banco) == 3
+    assert not fila.pendentes
+
+    # Mesmo log reenviado (p. ex. restaurado de backup): as chaves já estão no banco
+    repetida = FilaGravacoes(copia)
+    assert len(repetida.pendentes) == 3
+    assert repetida.reenviar(banco) == 3
+    assert len(banco.pesagens) == 3
+    assert not repetida.rejeitadas
+
+
+def test_duplicidade_no_meio_do_lote_rejeita_so_a_linha(tmp_path, banco):
+    banco.pesagens.append({**_pesagem(2), "chave_idempotencia": "gravada-antes"})
+    fila = FilaGravacoes(tmp_path)
+    chaves = [fila.enfileirar("inserir_pesagem", _pesagem(i)) for i in (1, 2, 3)]
+
+    assert fila.reenviar(banco) == 3
+    assert sorted(p["id_coletor"] for p in banco.pesagens) == [1, 2, 3]
+    assert [(r["chave"], r["resultado"]) for r in fila.rejeitadas] == [(chaves[1], "duplicada")]
+
+    # A rejeitada continua visível depois de reabrir a fila, até ser descartada
+    reaberta = FilaGravacoes(tmp_path)
+    assert not reaberta.pendentes
+    assert [r["chave"] for r in reaberta.rejeitadas] == [chaves[1]]
+    reaberta.descartar_rejeitadas()
+    assert not FilaGravacoes(tmp_path).rejeitadas
+
+
+def test_outra_chave_unica_nao_e_duplicidade(tmp_path, banco):
+    def protocolo_repetido(linhas):
+        raise APIError({
+            "code": "23505",
+            "message": 'duplicate key value violates unique constraint "pesagens_numero_protocolo_key"'
+        })
+    banco._upsert = protocolo_repetido
+    fila = FilaGravacoes(tmp_path)
+    fila.enfileirar("inserir_pesagem", _pesagem(1))
+
+    assert fila.reenviar(banco) == 1
+    assert [r["resultado"] for r in fila.rejeitadas] == ["rejeitada"]
+
+
+def test_sem_conexao_as_gravacoes_continuam_na_fila(tmp_path, banco):
+    fila = FilaGravacoes(tmp_path)
+    fila.enfileirar("inserir_pesagem", _pesagem(1))
+    fila.enfileirar("atualizar_peso", {"id_pesagem": 7, "peso": 2.0, "peso_anterior": 1.5})
+    banco.offline = True
+    with pytest.raises(httpx.ConnectError):
+        fila.reenviar(banco)
+    assert len(FilaGravacoes(tmp_path).pendentes) == 2
+
+    banco.offline = False
+    assert fila.reenviar(banco) == 2
+    assert not FilaGravacoes(tmp_path).pendentes
+
+
+def test_alteracao_de_peso_confere_o_peso_anterior(tmp_path, banco):
+    banco.pesagens = [{"id_pesagem": 1, "peso": 1.5}, {"id_pesagem": 2, "peso": 4.0}]
+    fila = FilaGravacoes(tmp_path)
+    fila.enfileirar("atualizar_peso", {"id_pesagem": 1, "peso": 2.0, "peso_anterior": 1.5})
+    conflito = fila.enfileirar("atualizar_peso", {"id_pesagem": 2, "peso": 5.0, "peso_anterior": 3.0})
+    excluida = fila.enfileirar("atualizar_peso", {"id_pesagem": 9, "peso": 1.0, "peso_anterior": 1.0})
+
+    assert fila.reenviar(banco) == 3
+    assert banco.pesagens == [{"id_pesagem": 1, "peso": 2.0}, {"id_pesagem": 2, "peso": 4.0}]
+    assert [(r["chave"], r["resultado"]) for r in fila.rejeitadas] == [
+        (conflito, "conflito"), (excluida, "rejeitada")
+    ]
+
+
+@pytest.mark.parametrize("erro, conexao, definitivo", [
+    (httpx.ConnectError("sem rede"), True, False),
+    (httpx.ReadTimeout("lento"), True, False),
+    (APIError({"code": 502, "message": "JSON could not be generated"}), True, False),
+    (APIError({"code": "PGRST001", "message": "sem conexão com o banco"}), True, False),
+    (APIError({"code": "57P01", "message": "terminating connection"}), True, False),
+    (APIError({"code": "23505", "message": "duplicate key"}), False, True),
+    (APIError({"code": "22P02", "message": "invalid input syntax"}), False, True),
+    (APIError({"code": "42501", "message": "permission denied"}), False, False),
+    (APIError({"code": "PGRST301", "message": "JWT expired"}), False, False),
+    (APIError({"code": "PGRST204", "message": "column not found"}), False, False),
+    (APIError({"code": 404, "message": "JSON could not be generated"}), False, False),
+])
+def test_classificacao_dos_erros(erro, conexao, definitivo):
+    assert erro_de_conexao(erro) is conexao
+    assert erro_definitivo(erro) is definitivo
+
+
+def test_pool_descarta_numeros_de_outro_mes(tmp_path):
+    caminho = tmp_path / "protocolos.json"
+    caminho.write_text(json.dumps({"ano_mes": "0001", "numeros": ["00010001"]}), encoding="utf-8")
+    pool = PoolProtocolos(str(caminho))
+    assert pool.disponiveis() == 0
@@ -0,0 +1,63 @@
+# test_replica.py
+"""Réplica local (replica.py) contra um cliente Supabase falso."""
+import pytest
+
+from replica import Replica
+
+
+class _Consulta:
+    """Ignora os filtros: devolve a tabela inteira (a réplica regrava o que já tem)."""
+
+    def __init__(self, linhas):
+        self.linhas = linhas
+
+    def __getattr__(self, nome):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return type("Resposta", (), {"data": list(self.linhas)})()
+
+
+class SupabaseFalso:
+    def __init__(self):
+        self.tabelas = {"coletores": [], "materiais": [], "pesagens": [], "sorteios": [], "exclusoes": []}
+
+    def table(self, nome):
+        return _Consulta(self.tabelas[nome])
+
+
+def _pesagem(id_pesagem, peso=1.0):
+    return {
+        "id_pesagem": id_pesagem, "id_coletor": 1, "id_material": 1, "peso": peso,
+        "data_pesagem": "2025-03-10", "numero_protocolo": f"2503{id_pesagem:04d}",
+        "sorteado": False, "atualizado_em": "2025-03-10T10:00:00+00:00"
+    }
+
+
+@pytest.fixture
+def replica(tmp_path):
+    return Replica(str(tmp_path / "replica.sqlite"))
+
+
+def test_exclusoes_chegam_na_sincronizacao_normal(replica):
+    supabase = SupabaseFalso()
+    supabase.tabelas["pesagens"] = [_pesagem(1), _pesagem(2)]
+    replica.sincronizar(supabase)
+    assert replica.pronta()
+    assert replica.contar_pesagens() == 2
+
+    supabase.tabelas["pesagens"] = [_pesagem(2)]
+    supabase.tabelas["exclusoes"] = [{
+        "id_exclusao": 1, "tabela": "pesagens", "chave": 1, "excluida_em": "2025-03-10T11:00:00+00:00"
+    }]
+    replica.sincronizar(supabase)
+    assert replica.contar_pesagens() == 1
+    assert replica.pagina_pesagens(0, 10)["ID"].tolist() == [2]
+
+
+def test_gravacoes_da_estacao_aparecem_antes_da_sincronizacao(replica):
+    replica.gravar("pesagens", [_pesagem(7, peso=2.0)])
+    assert replica.pagina_pesagens(0, 10)["Peso (kg)"].tolist() == [2.0]
+
+    replica.atualizar_colunas("pesagens", [{"id_pesagem": 7, "peso": 3.5}])
+    assert replica.pagina_pesagens(0, 10)["Peso (kg)"].tolist() == [3.5]
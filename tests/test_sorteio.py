@@ -0,0 +1,75 @@
+# test_sorteio.py
+"""Algoritmos de sorteio e verificação pelo retrato (sorteio.py)."""
+import random
+
+import pytest
+
+from sorteio import (ALGORITMOS, gerar_retrato, hash_elegiveis, ler_retrato, main, sortear_com_semente,
+                     sortear_ponderado, sortear_uniforme)
+
+
+@pytest.mark.parametrize("algoritmo", sorted(ALGORITMOS))
+def test_mesma_semente_mesmos_sorteados(algoritmo):
+    ids = list(range(1, 501))
+    pesos = [float(i % 7) for i in ids]
+    primeiro = sortear_com_semente(ids, pesos, 10, "semente", algoritmo)
+    assert primeiro == sortear_com_semente(ids, pesos, 10, "semente", algoritmo)
+    assert primeiro != sortear_com_semente(ids, pesos, 10, "outra", algoritmo)
+    assert len(set(primeiro)) == 10
+
+
+def test_uniforme_fixo_entre_versoes():
+    # Só random() tem sequência garantida entre versões do Python: se este
+    # resultado mudar, sorteios já registrados deixam de ser verificáveis.
+    assert sortear_com_semente(list(range(100)), [1.0] * 100, 5, "abc", "uniforme-v1") == [77, 56, 71, 37, 83]
+
+
+def test_uniforme_sorteia_todos_quando_faltam_ids():
+    assert sorted(sortear_uniforme([3, 1, 2], 10, random.Random(1))) == [1, 2, 3]
+    assert sortear_uniforme([], 3) == []
+
+
+def test_uniforme_distribuicao():
+    contagem = [0] * 4
+    rng = random.Random(42)
+    for _ in range(8000):
+        contagem[sortear_uniforme([0, 1, 2, 3], 1, rng)[0]] += 1
+    assert all(1800 < c < 2200 for c in contagem)
+
+
+def test_ponderado_ignora_pesos_nulos_e_negativos():
+    ids = [10, 20, 30, 40]
+    sorteados = sortear_ponderado(ids, [0.0, 2.0, -1.0, 1.0], 4, random.Random(7))
+    assert sorted(sorteados) == [20, 40]
+
+
+def test_ponderado_proporcional_ao_peso():
+    contagem = {"leve": 0, "pesado": 0}
+    rng = random.Random(3)
+    for _ in range(4000):
+        contagem[sortear_ponderado(["leve", "pesado"], [1.0, 3.0], 1, rng)[0]] += 1
+    assert 0.70 < contagem["pesado"] / 4000 < 0.80
+
+
+def test_retrato_e_hash_conferem(tmp_path):
+    ids, pesos = [5, 8, 13], [1.25, 0.1, 30.0]
+    caminho = tmp_path / "elegiveis.csv"
+    caminho.write_text("".join(gerar_retrato(ids, pesos)), encoding="ascii")
+
+    lidos, pesos_lidos, hash_lido = ler_retrato(caminho)
+    assert list(lidos) == ids and list(pesos_lidos) == pesos
+    assert hash_lido == hash_elegiveis(ids, pesos)
+
+
+def test_cli_verifica_sorteio(tmp_path, capsys):
+    ids = list(range(1, 51))
+    pesos = [float(i) for i in ids]
+    caminho = tmp_path / "elegiveis.csv"
+    caminho.write_text("".join(gerar_retrato(ids, pesos)), encoding="ascii")
+    sorteados = sortear_com_semente(ids, pesos, 3, "s3m3nt3", "ponderado-v1")
+    argumentos = [str(caminho), "--semente", "s3m3nt3", "--quantidade", "3", "--algoritmo", "ponderado-v1",
+                  "--hash", hash_elegiveis(ids, pesos)]
+
+    assert main(argumentos + ["--sorteados", ",".join(map(str, sorteados))]) == 0
+    assert "✅" in capsys.readouterr().out
+    assert main(argumentos + ["--sorteados", ",".join(map(str, reversed(sorteados)))]) == 1